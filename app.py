@@ -3,7 +3,8 @@ import streamlit as st
 import subprocess
 import sys
 
-from pymilvus import MilvusClient
+from milvus_connection import MilvusConnectionPool
+from search_cache import SearchResultCache
 
 
 if os.name == "nt":  # Windows
@@ -11,11 +12,8 @@ if os.name == "nt":  # Windows
 else:  # Linux/macOS
     VENV_PYTHON = os.path.join(sys.prefix, "bin", "python")
 
-# Milvus Client Setup
-client = MilvusClient(
-    uri="http://host.docker.internal:19530",
-    token="root:Milvus"
-)
+# Milvus Client Setup (shared connection configured through .env, see milvus_connection.py)
+client = MilvusConnectionPool.client()
 
 def run_command(command):
     process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
@@ -76,6 +74,7 @@ if st.session_state.get("delete_confirm", False):
     st.sidebar.error(f"Do you really want delete {selected_collection}?")
     if st.sidebar.button("Yes"):
         client.drop_collection(collection_name=selected_collection)
+        SearchResultCache().bump_corpus_version()  # cached results may include the dropped paper
         st.sidebar.success(f"Collection '{selected_collection}' deleted successfully!")
         del st.session_state["delete_confirm"]  # Reset flag
         st.rerun()  # Refresh the UI
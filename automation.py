@@ -2,9 +2,14 @@ import asyncio
 import os
 import nest_asyncio
 import sys
+import time
 
+from concurrent.futures import ThreadPoolExecutor
+
+from embeddings import EmbeddingModelRegistry
+from ingest_cache import IngestionCache
 from llm_prompt import LLMPrompt
-from parser import LlamaPDFParser
+from parser import LlamaPDFParser, PARSER_VERSION
 from retrieval import MilvusEmbeddingManager
 from ToLatex import md_to_latex
 from usegemini import ModelGemini
@@ -14,56 +19,147 @@ from usegemini import ModelGemini
 nest_asyncio.apply()
 
 class PDFToMilvusAutomation:
-    def __init__(self, pdf_paths=None, output_dir=None):
+    def __init__(self, pdf_paths=None, output_dir=None, cache_dir=".ingest_cache", cache_max_bytes=5 * 1024 ** 3,
+                 parser_backend="llamaparse", extraction_workers=1, embedding_backend=None):
         self.pdf_paths = pdf_paths or []
         self.output_dir = output_dir
+        self.parser_backend = parser_backend
+        self.extraction_workers = extraction_workers
         if self.output_dir:
             os.makedirs(self.output_dir, exist_ok=True)
-        self.manager = MilvusEmbeddingManager()
+        self.manager = MilvusEmbeddingManager(embedding_backend=embedding_backend)
+        self.cache = None
+        if cache_dir:
+            self.cache = IngestionCache(cache_dir, cache_max_bytes, f"{PARSER_VERSION}-{parser_backend}",
+                                        self.manager.chunk_embedding_id)
 
-    def process_pdfs_and_dump_to_milvus(self):
+    def process_pdfs_and_dump_to_milvus(self, workers=1):
         """
         Converts each PDF to Markdown, then to JSON, and inserts the JSON into Milvus.
+        With workers > 1 the PDFs are ingested concurrently by a thread pool; a failure
+        in one document never stops the others.
         """
         if not self.output_dir:
             raise ValueError("Output directory is required for PDF processing.")
 
-        for pdf_path in self.pdf_paths:
-            print(f"Processing: {pdf_path}")
-            try:
-                # Define output paths for Markdown and JSON
-                base_name = os.path.splitext(os.path.basename(pdf_path))[0]
-                md_path = os.path.join(self.output_dir, f"{base_name}.md")
-                json_path = os.path.join(self.output_dir, f"{base_name}.json")
-                image_path = os.path.join(self.output_dir, base_name)
-
-                # Parse the PDF and generate JSON
-                parser = LlamaPDFParser(pdf_path, md_path, json_path, image_path)
+        batch_start = time.perf_counter()
+        outcomes = []
+
+        if workers <= 1:
+            for pdf_path in self.pdf_paths:
+                outcomes.append(self._process_single_pdf(pdf_path))
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                outcomes = list(executor.map(self._process_single_pdf, self.pdf_paths))
+
+        self._print_ingestion_summary(outcomes, time.perf_counter() - batch_start)
+        for model_name, stats in EmbeddingModelRegistry.report().items():
+            rss = f", +{stats['rss_delta_bytes'] / 1024 ** 2:.0f} MB RSS" if stats["rss_delta_bytes"] is not None else ""
+            print(f"  Embedding model {model_name}: loaded once in {stats['load_seconds']:.1f}s"
+                  f" ({stats['parameter_bytes'] / 1024 ** 2:.0f} MB parameters{rss})")
+        embedding_cache = self.manager.embedding_cache
+        if embedding_cache:
+            stats = embedding_cache.stats()
+            print(f"  Embedding cache: {stats['hit_rate']:.1%} hit rate "
+                  f"({stats['memory_hits']} memory, {stats['disk_hits']} disk, {stats['misses']} misses)")
+        return outcomes
+
+    def _process_single_pdf(self, pdf_path):
+        """Parse one PDF and insert it into Milvus, returning its outcome and timings."""
+        print(f"Processing: {pdf_path}")
+        outcome = {"pdf": pdf_path, "status": "ok", "error": None, "cached": False, "timings": {}}
+        start = time.perf_counter()
+        try:
+            # Define output paths for Markdown and JSON
+            base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+            md_path = os.path.join(self.output_dir, f"{base_name}.md")
+            json_path = os.path.join(self.output_dir, f"{base_name}.json")
+            image_path = os.path.join(self.output_dir, base_name)
+
+            cache_key, cached = self.cache.lookup(pdf_path) if self.cache else (None, None)
+            outcome["cached"] = cached is not None
+
+            # Parse the PDF and generate JSON, unless an unchanged copy was ingested before
+            step = time.perf_counter()
+            if cached:
+                self.cache.restore(cache_key, cached, md_path, json_path, image_path)
+            else:
+                parser = LlamaPDFParser(pdf_path, md_path, json_path, image_path, backend=self.parser_backend,
+                                        extraction_workers=self.extraction_workers,
+                                        embedding_backend=self.manager.embedding_backend)
                 parser.convert_md_to_json()  # This converts the PDF to Markdown, then to JSON
-
-                # Insert JSON into Milvus
-                print(f"Inserting JSON into Milvus for {base_name}")
-                self.manager.process_and_insert_json(json_path)
-                self.manager.create_indexes(base_name)
-
-            except Exception as e:
-                print(f"Error processing {pdf_path}: {e}")
-
-    def perform_vector_search(self, query=None, anns_field="sub_heading_embedding", limit=5, threshold=0.85):
+                if self.cache:
+                    self.cache.store(cache_key, md_path, json_path, image_path)
+            outcome["timings"]["parse"] = time.perf_counter() - step
+
+            # Insert JSON into Milvus
+            print(f"Inserting JSON into Milvus for {base_name}")
+            step = time.perf_counter()
+            cached_embeddings = self.cache.load_embeddings(cache_key, cached) if cached else None
+            embeddings = self.manager.process_and_insert_json(json_path, embeddings=cached_embeddings)
+            self.manager.create_indexes(base_name)
+            if self.cache and cached_embeddings is None and embeddings is not None:
+                self.cache.store_embeddings(cache_key, embeddings)
+            outcome["timings"]["insert"] = time.perf_counter() - step
+
+        except Exception as e:
+            print(f"Error processing {pdf_path}: {e}")
+            outcome["status"] = "failed"
+            outcome["error"] = str(e)
+
+        outcome["timings"]["total"] = time.perf_counter() - start
+        return outcome
+
+    @staticmethod
+    def _print_ingestion_summary(outcomes, elapsed):
+        """Print successes, failures and per-document timings for a dump run."""
+        succeeded = [o for o in outcomes if o["status"] == "ok"]
+        failed = [o for o in outcomes if o["status"] != "ok"]
+        cached = [o for o in outcomes if o["cached"]]
+
+        print("\nIngestion summary")
+        print(f"  Documents: {len(outcomes)}  Succeeded: {len(succeeded)}  Failed: {len(failed)}  From cache: {len(cached)}")
+        print(f"  Wall time: {elapsed:.1f}s")
+        for o in outcomes:
+            steps = ", ".join(f"{name}={secs:.1f}s" for name, secs in o["timings"].items())
+            source = " cached" if o["cached"] else ""
+            print(f"  [{o['status']}{source}] {os.path.basename(o['pdf'])} ({steps})")
+        for o in failed:
+            print(f"  Error in {os.path.basename(o['pdf'])}: {o['error']}")
+
+    def perform_vector_search(self, query=None, anns_field="sub_heading_embedding", limit=5, threshold=0.85,
+                              doc_ids=None, hybrid=False, node_type=None):
         """
         Performs a vector search on the data in Milvus.
         If no query is provided, performs default searches.
+        doc_ids optionally restricts every search to a set of documents. With hybrid, one
+        fused search over all four vector fields replaces the sub-heading search, and the
+        figure is taken from its hits. node_type ("image" or "text") restricts the query
+        search to those nodes, filtered in Milvus.
         """
         text_results = []
-
-        if query:
+        content_results = {}
+
+        if query and hybrid:
+            print(f"Performing hybrid search for query: {query}")
+            text_results = self.manager.hybrid_query(query, limit=limit, doc_ids=doc_ids, collapse_chunks=True,
+                                                     node_type=node_type)
+            # Fused scores have no fixed relevance scale, so the figure comes from the best
+            # relevant hit that has an image rather than from a separate image search.
+            content_results = {
+                name: [hit for hit in hits if hit["image"] not in ("No image provided", "No image available")][:1]
+                for name, hits in text_results.items()
+            }
+        elif query:
             print(f"Performing content-based search for query: {query}")
-            text_results = self.manager.query(query, anns_field=anns_field, limit=limit, threshold=threshold)
+            text_results = self.manager.query(query, anns_field=anns_field, limit=limit, threshold=threshold,
+                                              doc_ids=doc_ids, collapse_chunks=True, node_type=node_type)
             print(f"Performing Image content search for query: {query}")
-            content_results = self.manager.query(query, anns_field="content_embedding", limit=1, threshold=0.8)
+            content_results = self.manager.query(query, anns_field="content_embedding", limit=1, threshold=0.8,
+                                                 doc_ids=doc_ids, node_type="image")
         
         print("Performing default searches...")
-        default_results = self.manager.perform_default_queries()
+        default_results = self.manager.perform_default_queries(doc_ids=doc_ids)
 
         return {
             'query': query,
@@ -136,34 +232,65 @@ async def main():
     # Get mode, list of PDF files, and optional output directory or query
     if len(sys.argv) < 2:
         print("Usage:")
-        print("  Dumping to Milvus: python automation.py dump <pdf1> <pdf2> ... <output_directory>")
-        print("  Search: python automation.py search [<query>]")
+        print("  Dumping to Milvus: python automation.py dump [--workers N] [--no-cache] [--parser llamaparse|pymupdf] [--extract-workers N] [--embedding-backend torch|onnx-int8] <pdf1> <pdf2> ... <output_directory>")
+        print("  Search: python automation.py search [--hybrid] [--images|--text] [<query>]")
         sys.exit(1)
 
     mode = sys.argv[1].lower()
 
     if mode == "dump":
-        if len(sys.argv) < 4:
-            print("Usage: python automation.py dump <pdf1> <pdf2> ... <output_directory>")
+        args = sys.argv[2:]
+        workers = 1
+        cache_dir = ".ingest_cache"
+        parser_backend = "llamaparse"
+        extraction_workers = 1
+        embedding_backend = None
+        while args and args[0].startswith("--"):
+            if args[0] == "--workers" and len(args) > 1:
+                workers = int(args[1])
+                args = args[2:]
+            elif args[0] == "--parser" and len(args) > 1:
+                parser_backend = args[1]
+                args = args[2:]
+            elif args[0] == "--extract-workers" and len(args) > 1:
+                extraction_workers = int(args[1])
+                args = args[2:]
+            elif args[0] == "--embedding-backend" and len(args) > 1:
+                embedding_backend = args[1]
+                args = args[2:]
+            elif args[0] == "--no-cache":
+                cache_dir = None
+                args = args[1:]
+            else:
+                break
+
+        if len(args) < 2:
+            print("Usage: python automation.py dump [--workers N] [--no-cache] [--parser llamaparse|pymupdf] [--extract-workers N] [--embedding-backend torch|onnx-int8] <pdf1> <pdf2> ... <output_directory>")
             sys.exit(1)
 
-        pdf_files = sys.argv[2:-1]
-        output_directory = sys.argv[-1]
+        pdf_files = args[:-1]
+        output_directory = args[-1]
 
         # Initialize the automation process for dumping
-        automation = PDFToMilvusAutomation(pdf_files, output_directory)
+        automation = PDFToMilvusAutomation(pdf_files, output_directory, cache_dir=cache_dir,
+                                           parser_backend=parser_backend, extraction_workers=extraction_workers,
+                                           embedding_backend=embedding_backend)
 
         # Process PDFs to JSON and insert into Milvus
-        automation.process_pdfs_and_dump_to_milvus()
+        automation.process_pdfs_and_dump_to_milvus(workers=workers)
 
     elif mode == "search":
-        user_query = sys.argv[2] if len(sys.argv) > 2 else None
+        args = sys.argv[2:]
+        hybrid = "--hybrid" in args
+        node_type = "image" if "--images" in args else "text" if "--text" in args else None
+        args = [arg for arg in args if arg not in ("--hybrid", "--images", "--text")]
+        user_query = args[0] if args else None
 
         # Initialize the automation process for search
         automation = PDFToMilvusAutomation()
 
         # Perform vector searches
-        search_result = automation.perform_vector_search(query=user_query)
+        search_result = automation.perform_vector_search(query=user_query, hybrid=hybrid, node_type=node_type)
 
         os.makedirs("./extracted", exist_ok=True)
 
@@ -0,0 +1,61 @@
+import json
+import sys
+import time
+
+from embeddings import encode_batched, get_embedding_model
+from retrieval import MilvusEmbeddingManager
+
+
+def load_rows(json_files):
+    """Flatten parser node JSON, or newparse section JSON such as cnn1.json, into rows."""
+    rows = []
+    for json_file in json_files:
+        with open(json_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data and "metadata" not in data[0] and "subheadings" not in data[0]:
+            data = [{"content": d.get("content", ""),
+                     "metadata": {"main title": d.get("main title", ""), "section title": d.get("section title", "")}}
+                    for d in data]
+        rows.extend(MilvusEmbeddingManager.flatten_nodes(data))
+    return rows
+
+
+def per_field(model, rows):
+    """The previous path: four encode calls of batch size 1 per node."""
+    for row in rows:
+        for text in (row["main_title"], row["section_title"], row["sub_heading"], row["content"]):
+            if text:
+                model.encode(text)
+
+
+def batched(model, rows, batch_size):
+    texts = []
+    for row in rows:
+        texts.extend([row["main_title"], row["section_title"], row["sub_heading"], row["content"]])
+    encode_batched(model, texts, batch_size=batch_size)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python -m benchmarks.bench_embedding <nodes.json> [<nodes.json> ...]")
+        sys.exit(1)
+
+    rows = load_rows(sys.argv[1:])
+    model = get_embedding_model()
+    model.encode(["warm up"])
+    print(f"Nodes: {len(rows)}")
+
+    start = time.perf_counter()
+    per_field(model, rows)
+    seconds = time.perf_counter() - start
+    print(f"Per-field, batch size 1: {len(rows) / seconds:8.1f} nodes/s ({seconds:.1f}s)")
+
+    for batch_size in (16, 32, 64, 128):
+        start = time.perf_counter()
+        batched(model, rows, batch_size)
+        seconds = time.perf_counter() - start
+        print(f"Batched, batch size {batch_size:3d}: {len(rows) / seconds:8.1f} nodes/s ({seconds:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
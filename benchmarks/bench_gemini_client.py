@@ -0,0 +1,43 @@
+import asyncio
+import sys
+import time
+
+from benchmarks.fake_gemini_server import FakeGeminiServer
+from usegemini import ModelGemini
+
+
+async def run_prompts(client, prompts):
+    return await asyncio.gather(*[client.gemini_response(prompt) for prompt in prompts])
+
+
+def main():
+    """
+    Runs the review's section prompts through ModelGemini against a local fake Gemini server
+    that adds latency and answers some requests with 429, once with one request at a time and
+    once with the concurrency cap, and reports wall time, retries and what the server saw.
+    """
+    prompts = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+
+    texts = [f"Write section {i} of the review." for i in range(prompts)]
+    for concurrency in (1, 4):
+        fake = FakeGeminiServer(latency=latency, jitter=0.1, error_rate=error_rate, max_concurrent=8).start()
+        client = ModelGemini(api_key="fake-key", api_endpoint=fake.endpoint, max_concurrency=concurrency,
+                             requests_per_minute=600, backoff_base=0.2, backoff_cap=2.0)
+        try:
+            start = time.perf_counter()
+            responses = asyncio.run(run_prompts(client, texts))
+            seconds = time.perf_counter() - start
+        finally:
+            client.close()
+            fake.stop()
+        stats = fake.stats()
+        assert len(responses) == prompts and all(responses)
+        print(f"concurrency {concurrency}: {prompts} prompts in {seconds:5.2f}s, {client.retries} retries, "
+              f"server saw {stats['requests']} requests, {stats['rejected']} rejected, "
+              f"peak {stats['peak_in_flight']} in flight")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import json
+import sys
+import time
+
+import numpy as np
+from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, MilvusException, utility
+
+from retrieval import MilvusEmbeddingManager, VECTOR_FIELDS
+
+# (index type, build params, search params to try on that build)
+INDEX_CONFIGS = (
+    [("FLAT", {}, [{}])]
+    + [("HNSW", {"M": m, "efConstruction": ef_construction}, [{"ef": ef} for ef in (16, 32, 64, 128, 256)])
+       for m in (8, 16, 32) for ef_construction in (100, 200, 400)]
+    + [("IVF_FLAT", {"nlist": nlist}, [{"nprobe": nprobe} for nprobe in (1, 4, 16, 64)])
+       for nlist in (16, 64, 128, 256)]
+    + [("IVF_PQ", {"nlist": nlist, "m": m, "nbits": 8}, [{"nprobe": nprobe} for nprobe in (4, 16, 64)])
+       for nlist in (64, 128) for m in (32, 64, 128)]
+    + [("SCANN", {"nlist": nlist, "with_raw_data": True},
+        [{"nprobe": nprobe, "reorder_k": reorder_k} for nprobe in (4, 16, 64) for reorder_k in (50, 200)])
+       for nlist in (64, 128)]
+)
+
+
+def load_corpus(manager, json_files, query_file=None):
+    """Embed every node of the given JSON files, plus the benchmark queries."""
+    rows = []
+    for json_file in json_files:
+        with open(json_file, "r", encoding="utf-8") as f:
+            rows.extend(manager.flatten_nodes(json.load(f)))
+    corpus = manager.embed_rows(rows)
+
+    if query_file:
+        with open(query_file, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        # Section-style queries: the default queries and the sub headings of the corpus itself.
+        queries = list(dict.fromkeys(list(manager.DEFAULT_QUERIES) + [row["sub_heading"] for row in rows if row["sub_heading"]]))
+    return corpus, np.asarray(manager.generate_embeddings_batch(queries), dtype=np.float32)
+
+
+def exact_top_k(vectors, queries, k):
+    """Ground-truth neighbour ids (row positions) by brute-force inner product."""
+    scores = queries @ vectors.T
+    k = min(k, vectors.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row.tolist()) for row in top]
+
+
+def create_field_collection(name, vectors, alias):
+    if utility.has_collection(name, using=alias):
+        utility.drop_collection(name, using=alias)
+    schema = CollectionSchema([
+        FieldSchema(name="id", dtype=DataType.INT64, is_primary=True),
+        FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=vectors.shape[1]),
+    ], description="Index benchmark")
+    collection = Collection(name=name, schema=schema, using=alias)
+    for start in range(0, len(vectors), 1000):
+        batch = vectors[start:start + 1000]
+        collection.insert([list(range(start, start + len(batch))), batch])
+    collection.flush()
+    return collection
+
+
+def build_index(collection, index_type, build_params, alias):
+    """Replace the collection's index and load it; returns the build seconds."""
+    collection.release()
+    for index in collection.indexes:
+        collection.drop_index(index_name=index.index_name)
+    start = time.perf_counter()
+    collection.create_index("vector", {"index_type": index_type, "metric_type": "IP", "params": build_params})
+    utility.wait_for_index_building_complete(collection.name, using=alias)
+    seconds = time.perf_counter() - start
+    collection.load()
+    return seconds
+
+
+def index_memory(collection, alias):
+    """Query node memory of the loaded segments, or None where the server doesn't report it."""
+    try:
+        return sum(segment.mem_size for segment in utility.get_query_segment_info(collection.name, using=alias))
+    except Exception:  # Milvus Lite does not implement segment info.
+        return None
+
+
+def run_searches(collection, queries, ground_truth, search_params, k):
+    """Search one query at a time; returns (recall@k, p50 ms, p99 ms)."""
+    param = {"metric_type": "IP", "params": search_params}
+    collection.search([queries[0].tolist()], "vector", param, limit=k)
+    latencies = []
+    recalls = []
+    for query, expected in zip(queries, ground_truth):
+        start = time.perf_counter()
+        hits = collection.search([query.tolist()], "vector", param, limit=k)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(expected & {hit.id for hit in hits}) / len(expected))
+    return float(np.mean(recalls)), float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99))
+
+
+def main():
+    """
+    Sweeps Milvus index types and their build and search parameters over a corpus built from
+    ingested JSON, per vector field, and reports recall@k against exact search, p50/p99 search
+    latency, index build time and loaded memory. Needs a Milvus server (MILVUS_URI or
+    MILVUS_HOST/MILVUS_PORT); Milvus Lite only supports FLAT, IVF_FLAT and AUTOINDEX.
+    """
+    args = sys.argv[1:]
+    k = 10
+    query_file = None
+    fields = list(VECTOR_FIELDS)
+    while args and args[0].startswith("--"):
+        flag, value, args = args[0], args[1], args[2:]
+        if flag == "--k":
+            k = int(value)
+        elif flag == "--queries":
+            query_file = value
+        elif flag == "--fields":
+            fields = value.split(",")
+        else:
+            args = []
+    if not args:
+        print("Usage: python -m benchmarks.bench_index [--k 10] [--queries queries.txt] "
+              "[--fields content_embedding,...] <nodes.json> [<nodes.json> ...]")
+        sys.exit(1)
+
+    manager = MilvusEmbeddingManager()
+    corpus, queries = load_corpus(manager, args, query_file)
+    print(f"{corpus.shape[0]} nodes, {len(queries)} queries, k={k}.")
+    print(f"{'field':>24} {'index':>9} {'build params':>42} {'search params':>30} "
+          f"{'recall':>7} {'p50 ms':>7} {'p99 ms':>7} {'build s':>8} {'mem MB':>7}")
+
+    for field in fields:
+        # Empty fields are stored as zero vectors, which never match, and titles repeat on every
+        # node of a document; leave both out so ties don't decide recall.
+        vectors = corpus[:, VECTOR_FIELDS.index(field)]
+        vectors = np.unique(vectors[np.abs(vectors).sum(axis=1) > 0], axis=0)
+        if len(vectors) == 0:
+            print(f"{field:>24} has no non-empty vectors, skipped.")
+            continue
+        ground_truth = exact_top_k(vectors, queries, k)
+        collection = create_field_collection(f"bench_index_{field}", vectors, manager.alias)
+        try:
+            for index_type, build_params, search_sweep in INDEX_CONFIGS:
+                try:
+                    build_seconds = build_index(collection, index_type, build_params, manager.alias)
+                except MilvusException as e:
+                    print(f"{field:>24} {index_type:>9} {json.dumps(build_params):>42} skipped: {e.message}")
+                    continue
+                memory = index_memory(collection, manager.alias)
+                memory = f"{memory / 1024 ** 2:7.1f}" if memory is not None else f"{'n/a':>7}"
+                for search_params in search_sweep:
+                    try:
+                        recall, p50, p99 = run_searches(collection, queries, ground_truth, search_params, k)
+                    except MilvusException as e:
+                        print(f"{field:>24} {index_type:>9} {json.dumps(build_params):>42} "
+                              f"{json.dumps(search_params):>30} skipped: {e.message}")
+                        continue
+                    print(f"{field:>24} {index_type:>9} {json.dumps(build_params):>42} {json.dumps(search_params):>30} "
+                          f"{recall:7.3f} {p50:7.2f} {p99:7.2f} {build_seconds:8.2f} {memory}")
+        finally:
+            utility.drop_collection(collection.name, using=manager.alias)
+
+
+if __name__ == "__main__":
+    main()
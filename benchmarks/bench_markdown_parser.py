@@ -0,0 +1,127 @@
+import random
+import re
+import sys
+import time
+
+from parser import LlamaPDFParser
+
+
+def legacy_parse_markdown_to_json(md_content):
+    """The original per-line, root-walking parser, kept as the reference implementation."""
+    main_title = ""
+    hierarchy = {}
+    current_levels = []
+
+    for line in md_content.splitlines():
+        if re.match(r"^# ", line):
+            if not main_title:
+                main_title = line.strip("# ").strip()
+            continue
+
+        heading_match = re.match(r"^(#+) (.+)", line)
+        if heading_match:
+            level = len(heading_match.group(1))
+            heading_text = heading_match.group(2)
+
+            while len(current_levels) >= level:
+                current_levels.pop()
+            current_levels.append(heading_text)
+
+            metadata = {
+                "main title": main_title,
+                "section title": current_levels[0] if len(current_levels) > 0 else "",
+                "sub heading": current_levels[1] if len(current_levels) > 1 else "",
+            }
+
+            current_level = hierarchy
+            for lvl in current_levels[:-1]:
+                current_level = current_level.setdefault(lvl, {"content": "", "subheadings": {}})["subheadings"]
+
+            if current_levels[-1] not in current_level:
+                current_level[current_levels[-1]] = {"content": "", "metadata": metadata, "subheadings": {}}
+
+        else:
+            if current_levels:
+                current_level = hierarchy
+                for lvl in current_levels[:-1]:
+                    current_level = current_level[lvl]["subheadings"]
+                current_level[current_levels[-1]]["content"] += line.strip() + "\n"
+
+    return hierarchy
+
+
+def legacy_format_hierarchy_to_json(hierarchy):
+    json_list = []
+    for key, value in hierarchy.items():
+        json_list.append({
+            "content": value["content"].strip(),
+            "metadata": value.get("metadata", {}),
+            "embeddings-Main-Headding": "",
+            "embeddings-Section-Headding": "",
+            "embeddings-Sub-Headding": "",
+            "subheadings": legacy_format_hierarchy_to_json(value["subheadings"]),
+        })
+    return json_list
+
+
+def synthetic_markdown(size_mb, seed=0):
+    """
+    Builds a paper-like Markdown document of roughly size_mb megabytes: numbered
+    sections and subsections, repeated headings such as "Proof", deeper headings,
+    stray "# " lines and long paragraphs.
+    """
+    rng = random.Random(seed)
+    words = ("convolutional network layer pooling kernel stride gradient activation feature map "
+             "training dataset accuracy model input output neuron weight bias loss").split()
+    target = int(size_mb * 1024 * 1024)
+    parts = ["# A Synthetic Survey of Convolutional Networks\n\n"]
+    size = len(parts[0])
+    section = 0
+
+    while size < target:
+        section += 1
+        chunk = [f"## {section} Section {section}\n\n"]
+        for sub in range(1, rng.randint(2, 6)):
+            chunk.append(f"### {section}.{sub} Topic {rng.choice(words)} {sub}\n\n")
+            if rng.random() < 0.3:
+                chunk.append("#### Proof\n\n")
+            if rng.random() < 0.05:
+                chunk.append("# Stray title line\n\n")
+            for _ in range(rng.randint(5, 40)):
+                sentence = " ".join(rng.choice(words) for _ in range(rng.randint(8, 30)))
+                chunk.append(f"  {sentence.capitalize()}.  \n\n")
+        text = "".join(chunk)
+        parts.append(text)
+        size += len(text)
+
+    return "".join(parts)
+
+
+def main():
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    print(f"Generating {size_mb:.0f} MB of synthetic Markdown...")
+    md_content = synthetic_markdown(size_mb)
+    print(f"Lines: {md_content.count(chr(10))}")
+
+    parser = LlamaPDFParser.__new__(LlamaPDFParser)
+
+    start = time.perf_counter()
+    hierarchy, formatted = parser._parse_markdown(md_content)
+    new_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    legacy_hierarchy = legacy_parse_markdown_to_json(md_content)
+    legacy_formatted = legacy_format_hierarchy_to_json(legacy_hierarchy)
+    legacy_seconds = time.perf_counter() - start
+
+    identical = hierarchy == legacy_hierarchy and formatted == legacy_formatted
+    print(f"Legacy parse + format: {legacy_seconds:.2f}s ({size_mb / legacy_seconds:.1f} MB/s)")
+    print(f"Stack parser (one pass): {new_seconds:.2f}s ({size_mb / new_seconds:.1f} MB/s)")
+    print(f"Speedup: {legacy_seconds / new_seconds:.1f}x  Identical output: {identical}")
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
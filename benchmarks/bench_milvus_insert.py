@@ -0,0 +1,107 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from pymilvus import connections, utility
+
+from embeddings import EMBEDDING_DIM
+from retrieval import MilvusEmbeddingManager
+
+
+def synthetic_nodes(count):
+    return [{"content": f"Paragraph {i} " * 20,
+             "metadata": {"main title": "Synthetic paper", "section title": f"Section {i // 10}",
+                          "sub heading": f"Subsection {i}"},
+             "subheadings": []} for i in range(count)]
+
+
+def per_row_insert(manager, collection, rows, vectors):
+    """The previous path: one insert request per node, with the columns of the collection's schema."""
+    for i, row in enumerate(rows):
+        manager._insert_rows(collection, [row], vectors[i:i + 1])
+    collection.flush()
+
+
+def benchmark_rows(manager, nodes, doc_id):
+    """Rows of synthetic nodes as process_and_insert_json builds them, with random unit vectors."""
+    rows = manager.chunk_rows(manager.assign_section_ids(manager.flatten_nodes(synthetic_nodes(nodes)), doc_id))
+    vectors = np.random.default_rng(0).standard_normal((len(rows), 4, EMBEDDING_DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return rows, vectors
+
+
+def smoke_check(manager, nodes=3):
+    """
+    Runs per_row_insert against a collection with the manager's current schema, so a schema
+    change that breaks the per-row path fails here before any timing starts.
+    """
+    name = "bench_insert_smoke"
+    rows, vectors = benchmark_rows(manager, nodes, name)
+    collection = manager.create_or_load_collection(name)
+    try:
+        per_row_insert(manager, collection, rows, vectors)
+        if collection.num_entities != len(rows):
+            raise RuntimeError(f"Per-row insert stored {collection.num_entities} of {len(rows)} rows.")
+    finally:
+        utility.drop_collection(name)
+    print(f"Smoke check passed: per-row insert matches the {len(collection.schema.fields)}-field schema.")
+
+
+def main():
+    """
+    Compares inserts per second of the per-row path and the batched path. Vectors are random
+    so only the Milvus side is measured. Runs against Milvus Lite in a temporary file unless
+    a server is given as host:port. With --smoke, only checks that the per-row path still
+    matches the collection schema.
+    """
+    args = sys.argv[1:]
+    smoke_only = "--smoke" in args
+    if smoke_only:
+        args.remove("--smoke")
+    nodes = int(args[0]) if len(args) > 0 else 2000
+    server = args[1] if len(args) > 1 else None
+
+    workdir = tempfile.mkdtemp()
+    if server:
+        host, port = server.split(":")
+        connections.connect("default", host=host, port=port)
+    else:
+        connections.connect("default", uri=os.path.join(workdir, "bench.db"))
+
+    json_file = os.path.join(workdir, "bench_insert.json")
+    with open(json_file, "w", encoding="utf-8") as f:
+        json.dump(synthetic_nodes(nodes), f)
+
+    # Neither cache is used, so benchmark ingestion leaves the user's cached results alone.
+    manager = MilvusEmbeddingManager(embedding_cache_path=None, search_cache_path=None, connect=False)
+    rows, vectors = benchmark_rows(manager, nodes, "bench_insert_per_row")
+
+    try:
+        smoke_check(manager)
+        if smoke_only:
+            return
+        collection = manager.create_or_load_collection("bench_insert_per_row")
+        start = time.perf_counter()
+        per_row_insert(manager, collection, rows, vectors)
+        seconds = time.perf_counter() - start
+        print(f"Per-row inserts: {nodes / seconds:10.1f} nodes/s ({seconds:.2f}s)")
+        utility.drop_collection("bench_insert_per_row")
+
+        for batch_size in (64, 256, 1024):
+            manager.insert_batch_size = batch_size
+            start = time.perf_counter()
+            manager.process_and_insert_json(json_file, embeddings=vectors)
+            seconds = time.perf_counter() - start
+            print(f"Batched, {batch_size:4d} rows: {nodes / seconds:10.1f} nodes/s ({seconds:.2f}s)")
+            utility.drop_collection("bench_insert")
+    finally:
+        connections.disconnect("default")
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import json
+import multiprocessing
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_embedding import load_rows
+from embeddings import (EMBEDDING_BACKENDS, EmbeddingModelRegistry, _rss_bytes, embedding_id, get_embedding_model,
+                        parity_check)
+
+
+def run_backend(backend, texts, batch_size, queue):
+    """Measure one backend in a fresh process so its memory numbers are not mixed with the other's."""
+    rss_start = _rss_bytes()
+    model = get_embedding_model(backend=backend)
+    model.encode(["warm up"])
+
+    latencies = []
+    for text in texts[:50]:
+        start = time.perf_counter()
+        model.encode([text])
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    model.encode(texts, batch_size=batch_size)
+    seconds = time.perf_counter() - start
+
+    rss_end = _rss_bytes()
+    queue.put({
+        "backend": backend,
+        "load_seconds": EmbeddingModelRegistry.report()[embedding_id(backend=backend)]["load_seconds"],
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "p99_ms": float(np.percentile(latencies, 99)) * 1000,
+        "texts_per_second": len(texts) / seconds,
+        "rss_mb": (rss_end - rss_start) / 1024 ** 2 if rss_start is not None and rss_end is not None else None,
+    })
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python -m benchmarks.bench_onnx_embedding <nodes.json> [<nodes.json> ...] [--batch-size N]")
+        sys.exit(1)
+
+    args = sys.argv[1:]
+    batch_size = 32
+    if "--batch-size" in args:
+        index = args.index("--batch-size")
+        batch_size = int(args[index + 1])
+        del args[index:index + 2]
+
+    texts = []
+    for row in load_rows(args):
+        texts.extend(text for text in (row["main_title"], row["section_title"], row["sub_heading"], row["content"])
+                     if text)
+    texts = list(dict.fromkeys(texts))
+    print(f"Unique texts: {len(texts)}")
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for backend in EMBEDDING_BACKENDS:
+        queue = context.Queue()
+        process = context.Process(target=run_backend, args=(backend, texts, batch_size, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+
+    for result in results:
+        rss = f"{result['rss_mb']:.0f} MB" if result["rss_mb"] is not None else "n/a"
+        print(f"{result['backend']:>10}: load {result['load_seconds']:.1f}s  p50 {result['p50_ms']:.1f} ms"
+              f"  p99 {result['p99_ms']:.1f} ms  {result['texts_per_second']:.1f} texts/s  RSS {rss}")
+
+    print("Parity against the fp32 model:")
+    print(json.dumps(parity_check(texts[:500]), indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import sys
+
+import numpy as np
+
+from benchmarks.bench_embedding import load_rows
+from embeddings import EMBEDDING_DIM
+from retrieval import MilvusEmbeddingManager
+from vector_storage import VectorStorage, fit_pca
+
+FIELDS = ("main_title", "section_title", "sub_heading", "content")
+
+
+def simulate_sq8(vectors):
+    """Per-dimension min/max 8-bit scalar quantization, as IVF_SQ8 stores vectors."""
+    low, high = vectors.min(axis=0), vectors.max(axis=0)
+    scale = np.where(high > low, (high - low) / 255.0, 1.0)
+    codes = np.round((vectors - low) / scale)
+    return (codes * scale + low).astype(np.float32)
+
+
+def recall_at_k(corpus, queries, exact_corpus, exact_queries, k):
+    """Fraction of the exact float32 top-k that the compressed vectors also rank in their top-k."""
+    k = min(k, len(corpus))
+    truth = np.argsort(-(exact_queries @ exact_corpus.T), axis=1)[:, :k]
+    found = np.argsort(-(queries @ corpus.T), axis=1)[:, :k]
+    return float(np.mean([len(set(t) & set(f)) / k for t, f in zip(truth, found)]))
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python -m benchmarks.bench_vector_storage <nodes.json> [<nodes.json> ...] [--pca-dims 128,256,384]")
+        sys.exit(1)
+
+    args = sys.argv[1:]
+    pca_dims = [128, 256, 384]
+    if "--pca-dims" in args:
+        index = args.index("--pca-dims")
+        pca_dims = [int(d) for d in args[index + 1].split(",")]
+        del args[index:index + 2]
+
+    rows = load_rows(args)
+    manager = MilvusEmbeddingManager(connect=False)
+    embeddings = manager.embed_rows(rows)
+    print(f"Nodes: {len(rows)}")
+
+    # Queries are the sub-heading vectors, searched against each field, as query() does.
+    queries = embeddings[:, 2]
+    queries = queries[np.any(queries, axis=1)]
+
+    modes = [("float32", lambda v: v, 4 * EMBEDDING_DIM),
+             ("float16", lambda v: v.astype(np.float16).astype(np.float32), 2 * EMBEDDING_DIM),
+             ("sq8", simulate_sq8, EMBEDDING_DIM)]
+    for dim in pca_dims:
+        if dim > len(rows) * len(FIELDS):
+            continue
+        path = f".vector_storage/bench_pca_{dim}.npz"
+        explained = fit_pca(embeddings.reshape(-1, EMBEDDING_DIM)[np.any(embeddings.reshape(-1, EMBEDDING_DIM), axis=1)],
+                            dim, path)
+        storage = VectorStorage("pca", path)
+        modes.append((f"pca-{dim} ({explained:.0%} var)", storage.transform, storage.vector_bytes()))
+
+    print(f"{'mode':>22}  {'bytes/node':>10}  {'saved':>6}  " + "  ".join(f"{f[:12]:>12}" for f in FIELDS))
+    for name, transform, vector_bytes in modes:
+        node_bytes = vector_bytes * len(FIELDS)
+        recalls = []
+        for field_index in range(len(FIELDS)):
+            corpus = embeddings[:, field_index]
+            recalls.append(recall_at_k(transform(corpus), transform(queries), corpus, queries, k=10))
+        saved = 1 - node_bytes / (4 * EMBEDDING_DIM * len(FIELDS))
+        print(f"{name:>22}  {node_bytes:>10}  {saved:>6.0%}  " + "  ".join(f"{r:>12.3f}" for r in recalls))
+    print("Recall is recall@10 against exact float32 inner-product search; PCA is fitted in-sample.")
+
+
+if __name__ == "__main__":
+    main()
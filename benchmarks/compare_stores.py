@@ -0,0 +1,67 @@
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from retrieval import MilvusEmbeddingManager, VECTOR_FIELDS
+
+
+def copy_to_local(milvus, local, collection_name):
+    """Copy a Milvus collection, vectors and scalars, into the local store with exact (FLAT) search."""
+    source = milvus.loaded_collection(collection_name)
+    target = local.store.Collection(name=collection_name, schema=source.schema)
+    field_names = [field.name for field in source.schema.fields]
+    for batch in milvus.scan(source, field_names):
+        columns = []
+        for name in field_names:
+            if name in VECTOR_FIELDS:
+                columns.append([milvus._stored_vector(entity[name]) for entity in batch])
+            else:
+                columns.append([entity[name] for entity in batch])
+        target.insert(columns)
+    target.flush()
+    for field in VECTOR_FIELDS:
+        target.create_index(field, {"index_type": "FLAT", "metric_type": "IP", "params": {}})
+
+
+def main():
+    """
+    Checks Milvus search results against exact search: every Milvus collection is copied into a
+    temporary local store, then each query is run on both and the overlap of the top-k ids is
+    reported per vector field.
+    """
+    queries = sys.argv[1:] or list(MilvusEmbeddingManager.DEFAULT_QUERIES)
+    k = 10
+
+    workdir = tempfile.mkdtemp()
+    milvus = MilvusEmbeddingManager()
+    local = MilvusEmbeddingManager(store="local", local_store_path=workdir)
+    try:
+        names = milvus.store.list_collections(using=milvus.alias)
+        for name in names:
+            copy_to_local(milvus, local, name)
+        print(f"Copied {len(names)} collections into {workdir}.")
+
+        vectors = np.asarray(milvus.generate_embeddings_batch(queries), dtype=np.float32)
+        for field in VECTOR_FIELDS:
+            overlaps = []
+            for name in names:
+                milvus_collection = milvus.loaded_collection(name)
+                local_collection = local.loaded_collection(name)
+                storage = milvus.storage_for_collection(milvus_collection)
+                data = list(storage.transform(vectors))
+                found = milvus_collection.search(data, field, storage.search_params(), limit=k)
+                exact = local_collection.search(data, field, storage.search_params(), limit=k)
+                for found_hits, exact_hits in zip(found, exact):
+                    exact_ids = {hit.id for hit in exact_hits}
+                    if exact_ids:
+                        overlaps.append(len(exact_ids & {hit.id for hit in found_hits}) / len(exact_ids))
+            recall = f"{np.mean(overlaps):.3f}" if overlaps else "n/a"
+            print(f"{field:>24}: recall@{k} against exact search {recall} over {len(overlaps)} searches")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
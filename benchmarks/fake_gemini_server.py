@@ -0,0 +1,127 @@
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGeminiServer:
+    """
+    Local stand-in for the Gemini REST API's generateContent endpoint. Every request waits
+    latency seconds (plus up to jitter more), then answers 429 RESOURCE_EXHAUSTED with
+    probability error_rate, or once more than max_concurrent requests are in flight, and
+    otherwise a canned completion. Counts requests, rejections and the peak concurrency seen.
+    """
+
+    PATH = re.compile(r"^/v1beta/models/([^/:]+):generateContent")
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.5, jitter=0.2, error_rate=0.1, max_concurrent=None,
+                 seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_concurrent = max_concurrent
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.rejected = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def endpoint(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status, body):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                match = fake.PATH.match(self.path)
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not match:
+                    self._reply(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+                    return
+
+                with fake.lock:
+                    fake.requests += 1
+                    fake.in_flight += 1
+                    fake.peak_in_flight = max(fake.peak_in_flight, fake.in_flight)
+                    overloaded = fake.max_concurrent is not None and fake.in_flight > fake.max_concurrent
+                    rejected = overloaded or fake.random.random() < fake.error_rate
+                    delay = fake.latency + fake.random.uniform(0, fake.jitter)
+                try:
+                    time.sleep(delay)
+                    if rejected:
+                        with fake.lock:
+                            fake.rejected += 1
+                        self._reply(429, {"error": {"code": 429, "message": "Resource has been exhausted.",
+                                                    "status": "RESOURCE_EXHAUSTED"}})
+                        return
+                    prompt = " ".join(part.get("text", "") for content in request.get("contents", [])
+                                      for part in content.get("parts", []))
+                    self._reply(200, {
+                        "candidates": [{
+                            "content": {"parts": [{"text": f"Fake response to: {prompt[:80]}"}], "role": "model"},
+                            "finishReason": "STOP",
+                            "index": 0,
+                        }],
+                        "usageMetadata": {"promptTokenCount": len(prompt.split()), "candidatesTokenCount": 8,
+                                          "totalTokenCount": len(prompt.split()) + 8},
+                        "modelVersion": match.group(1),
+                    })
+                finally:
+                    with fake.lock:
+                        fake.in_flight -= 1
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        with self.lock:
+            return {"requests": self.requests, "rejected": self.rejected, "peak_in_flight": self.peak_in_flight}
+
+
+def main():
+    """Serve until interrupted: python -m benchmarks.fake_gemini_server [<port>] [<latency>] [<error_rate>]"""
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8089
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.1
+    fake = FakeGeminiServer(port=port, latency=latency, error_rate=error_rate)
+    print(f"Fake Gemini API on {fake.endpoint} (latency {latency}s, 429 rate {error_rate:.0%}); "
+          f"set GEMINI_API_ENDPOINT={fake.endpoint} to use it.")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
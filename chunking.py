@@ -0,0 +1,87 @@
+import hashlib
+import re
+import threading
+
+# e5-large attends to at most 512 tokens, special tokens included; chunks stay below that
+# so no content is truncated away, and consecutive chunks share some context.
+DEFAULT_MAX_TOKENS = 480
+DEFAULT_OVERLAP_TOKENS = 64
+
+_tokenizers = {}
+_tokenizers_lock = threading.Lock()
+
+
+def get_tokenizer(model_name):
+    """The model's tokenizer, loaded once per process; None when it cannot be loaded."""
+    with _tokenizers_lock:
+        if model_name not in _tokenizers:
+            try:
+                from transformers import AutoTokenizer
+                _tokenizers[model_name] = AutoTokenizer.from_pretrained(model_name)
+            except (ImportError, OSError) as e:
+                print(f"No tokenizer for '{model_name}' ({type(e).__name__}); chunking by words instead.")
+                _tokenizers[model_name] = None
+        return _tokenizers[model_name]
+
+
+def chunking_id(tokenizer, max_tokens, overlap_tokens):
+    """Identifier of a chunking configuration; chunk vectors cached under another one are stale."""
+    if max_tokens <= 0:
+        return "sections"
+    return f"chunks:{getattr(tokenizer, 'name_or_path', None) or 'words'}:{max_tokens}/{overlap_tokens}"
+
+
+def chunk_row_id(parent_id, chunk_index):
+    """Deterministic 63-bit primary key of a chunk of a section; the first chunk keeps the section's id."""
+    if chunk_index == 0:
+        return parent_id
+    digest = hashlib.blake2b(f"{parent_id}\0{chunk_index}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") & (2 ** 63 - 1)
+
+
+class SectionChunker:
+    """
+    Splits section content into overlapping chunks of at most max_tokens tokens under the
+    embedding model's tokenizer, cut between words. Without a tokenizer, whitespace-separated
+    words stand in for tokens.
+    """
+
+    def __init__(self, tokenizer=None, max_tokens=DEFAULT_MAX_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS):
+        if not 0 <= overlap_tokens < max_tokens:
+            raise ValueError(f"Chunk overlap must be below the chunk size, got {overlap_tokens} and {max_tokens}.")
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def _token_spans(self, text):
+        """(start, end) character offsets of the text's tokens."""
+        if self.tokenizer is None:
+            return [(match.start(), match.end()) for match in re.finditer(r"\S+", text)]
+        encoded = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        return [(start, end) for start, end in encoded["offset_mapping"] if end > start]
+
+    def split(self, text):
+        """The chunks of text, in order; text that fits in one chunk is returned whole."""
+        spans = self._token_spans(text)
+        if len(spans) <= self.max_tokens:
+            return [text]
+        # A token starts a word when whitespace separates it from the previous token.
+        word_start = [i == 0 or spans[i][0] > spans[i - 1][1] for i in range(len(spans))]
+
+        chunks = []
+        start = 0
+        while True:
+            end = min(start + self.max_tokens, len(spans))
+            if end < len(spans):
+                cut = end
+                while cut > start + self.overlap_tokens + 1 and not word_start[cut]:
+                    cut -= 1
+                if word_start[cut]:
+                    end = cut
+            chunks.append(text[spans[start][0]:spans[end - 1][1]])
+            if end == len(spans):
+                return chunks
+            next_start = max(end - self.overlap_tokens, start + 1)
+            while next_start < end and not word_start[next_start]:
+                next_start += 1
+            start = next_start
@@ -0,0 +1,414 @@
+import gc
+import hashlib
+import json
+import numpy as np
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from collections import OrderedDict
+
+
+EMBEDDING_MODEL_NAME = 'embaas/sentence-transformers-e5-large-v2'
+EMBEDDING_DIM = 1024
+DEFAULT_BATCH_SIZE = 64
+
+# "torch" runs SentenceTransformer in full precision; "onnx-int8" runs a dynamically
+# int8-quantized ONNX export of the same model on ONNX Runtime.
+EMBEDDING_BACKENDS = ("torch", "onnx-int8")
+ONNX_MODEL_DIR = ".onnx_models"
+
+
+def embedding_id(model_name=EMBEDDING_MODEL_NAME, backend="torch"):
+    """Identifier of a model/backend pair, used to key caches of its vectors."""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def _rss_bytes():
+    """Current resident set size of this process, or None where it cannot be read."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+class OnnxEmbeddingModel:
+    """
+    Sentence embedder backed by an ONNX Runtime session over an exported (and optionally
+    int8-quantized) transformer. Exposes the subset of the SentenceTransformer interface
+    used here: encode, tokenizer, max_seq_length and get_sentence_embedding_dimension.
+    """
+
+    CONFIG = "onnx_config.json"
+
+    def __init__(self, model_dir, quantized=True, intra_op_threads=None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, self.CONFIG), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.model_path = os.path.join(model_dir, "model-int8.onnx" if quantized else "model.onnx")
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_seq_length = self.config["max_seq_length"]
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    @classmethod
+    def export(cls, model_name, model_dir, quantize=True):
+        """Export a SentenceTransformer to ONNX in model_dir and write its int8-quantized copy."""
+        import torch
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        from sentence_transformers import SentenceTransformer
+
+        os.makedirs(model_dir, exist_ok=True)
+        st_model = SentenceTransformer(model_name, device="cpu")
+        transformer = st_model[0].auto_model.eval()
+        tokenizer = st_model.tokenizer
+
+        pooling = "mean"
+        normalize = False
+        for module in st_model:
+            config = module.get_config_dict() if hasattr(module, "get_config_dict") else {}
+            if config.get("pooling_mode_cls_token"):
+                pooling = "cls"
+            if type(module).__name__ == "Normalize":
+                normalize = True
+
+        class LastHiddenState(torch.nn.Module):
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, *inputs):
+                return self.model(*inputs)[0]
+
+        sample = tokenizer(["export sample"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+        fp32_path = os.path.join(model_dir, "model.onnx")
+        with torch.no_grad():
+            torch.onnx.export(LastHiddenState(transformer), tuple(sample[name] for name in input_names), fp32_path,
+                              input_names=input_names, output_names=["last_hidden_state"],
+                              dynamic_axes=dynamic_axes, opset_version=14)
+        if quantize:
+            quantize_dynamic(fp32_path, os.path.join(model_dir, "model-int8.onnx"), weight_type=QuantType.QInt8)
+
+        tokenizer.save_pretrained(model_dir)
+        with open(os.path.join(model_dir, cls.CONFIG), "w", encoding="utf-8") as f:
+            json.dump({
+                "model_name": model_name,
+                "pooling": pooling,
+                "normalize": normalize,
+                "max_seq_length": st_model.max_seq_length,
+                "dim": st_model.get_sentence_embedding_dimension(),
+            }, f, indent=4)
+        print(f"Exported '{model_name}' to ONNX in {model_dir}.")
+
+    def get_sentence_embedding_dimension(self):
+        return self.config["dim"]
+
+    def model_bytes(self):
+        return os.path.getsize(self.model_path)
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, show_progress_bar=False, **kwargs):
+        """Encode one text or a list of texts, mirroring SentenceTransformer.encode."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            encoded = self.tokenizer(batch, padding=True, truncation=True, max_length=self.max_seq_length,
+                                     return_tensors="np")
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            if self.config["pooling"] == "cls":
+                pooled = hidden[:, 0]
+            else:
+                mask = encoded["attention_mask"][..., None].astype(np.float32)
+                pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.config["normalize"]:
+                pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            outputs.append(pooled.astype(np.float32))
+        vectors = np.concatenate(outputs) if outputs else np.zeros((0, self.config["dim"]), dtype=np.float32)
+        return vectors[0] if single else vectors
+
+
+class EmbeddingModelRegistry:
+    """
+    Process-wide registry of embedding models. Each model is loaded lazily on first use,
+    once per process and backend, and the same instance is handed to the parser, the
+    retrieval layer and newparse. Records load time, resident memory growth and model size.
+    """
+
+    _lock = threading.RLock()
+    _models = {}
+    _stats = {}
+
+    @classmethod
+    def _load(cls, model_name, backend):
+        if backend == "torch":
+            from sentence_transformers import SentenceTransformer
+            return SentenceTransformer(model_name)
+        if backend == "onnx-int8":
+            model_dir = os.path.join(ONNX_MODEL_DIR, model_name.replace("/", "__"))
+            if not os.path.exists(os.path.join(model_dir, OnnxEmbeddingModel.CONFIG)):
+                OnnxEmbeddingModel.export(model_name, model_dir)
+            return OnnxEmbeddingModel(model_dir, quantized=True)
+        raise ValueError(f"Unknown embedding backend '{backend}'. Choose one of {EMBEDDING_BACKENDS}.")
+
+    @classmethod
+    def get(cls, model_name=EMBEDDING_MODEL_NAME, backend="torch"):
+        """Return the shared instance of a model, loading it on first use."""
+        key = embedding_id(model_name, backend)
+        model = cls._models.get(key)
+        if model is not None:
+            return model
+
+        with cls._lock:
+            model = cls._models.get(key)
+            if model is None:
+                rss_before = _rss_bytes()
+                start = time.perf_counter()
+                model = cls._load(model_name, backend)
+                load_seconds = time.perf_counter() - start
+                rss_after = _rss_bytes()
+
+                if hasattr(model, "parameters"):
+                    model_bytes = sum(p.numel() * p.element_size() for p in model.parameters())
+                else:
+                    model_bytes = model.model_bytes()
+                cls._models[key] = model
+                cls._stats[key] = {
+                    "load_seconds": load_seconds,
+                    "rss_delta_bytes": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+                    "parameter_bytes": model_bytes,
+                }
+                print(f"Loaded embedding model '{key}' in {load_seconds:.1f}s.")
+        return model
+
+    @classmethod
+    def release(cls, model_name=None):
+        """Drop one model (or all of them) so its memory can be reclaimed."""
+        with cls._lock:
+            names = [model_name] if model_name else list(cls._models)
+            for name in names:
+                cls._models.pop(name, None)
+                cls._stats.pop(name, None)
+        gc.collect()
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    @classmethod
+    def is_loaded(cls, model_name=EMBEDDING_MODEL_NAME, backend="torch"):
+        return embedding_id(model_name, backend) in cls._models
+
+    @classmethod
+    def report(cls):
+        """Load time and memory figures for every loaded model."""
+        return {name: dict(stats) for name, stats in cls._stats.items()}
+
+
+def get_embedding_model(model_name=EMBEDDING_MODEL_NAME, backend="torch"):
+    """Shortcut for EmbeddingModelRegistry.get."""
+    return EmbeddingModelRegistry.get(model_name, backend)
+
+
+def parity_check(texts, model_name=EMBEDDING_MODEL_NAME, backend="onnx-int8", reference_backend="torch"):
+    """
+    Embed texts with a backend and with the reference backend and report how closely the
+    vectors agree: mean, minimum and 5th-percentile cosine similarity, and how often each
+    text's nearest neighbour among the others is the same under both backends.
+    """
+    texts = [text for text in texts if text]
+    reference = get_embedding_model(model_name, reference_backend).encode(texts, convert_to_numpy=True)
+    candidate = get_embedding_model(model_name, backend).encode(texts, convert_to_numpy=True)
+
+    def unit(vectors):
+        return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+    reference, candidate = unit(np.asarray(reference)), unit(np.asarray(candidate))
+    cosines = (reference * candidate).sum(axis=1)
+
+    neighbour_agreement = None
+    if len(texts) > 1:
+        ref_sim = reference @ reference.T
+        cand_sim = candidate @ candidate.T
+        np.fill_diagonal(ref_sim, -np.inf)
+        np.fill_diagonal(cand_sim, -np.inf)
+        neighbour_agreement = float((ref_sim.argmax(axis=1) == cand_sim.argmax(axis=1)).mean())
+
+    return {
+        "texts": len(texts),
+        "mean_cosine": float(cosines.mean()),
+        "min_cosine": float(cosines.min()),
+        "p5_cosine": float(np.percentile(cosines, 5)),
+        "nearest_neighbour_agreement": neighbour_agreement,
+    }
+
+
+def _token_lengths(model, texts):
+    """Token counts of the texts under the model's tokenizer, or character counts without one."""
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        return [len(text) for text in texts]
+    max_length = getattr(model, "max_seq_length", None) or 512
+    encoded = tokenizer(texts, add_special_tokens=False, truncation=True, max_length=max_length)
+    return [len(ids) for ids in encoded["input_ids"]]
+
+
+class EmbeddingCache:
+    """
+    Disk-backed embedding cache in SQLite, keyed by the hash of the model name and the
+    whitespace-normalized text, with an in-process LRU tier in front of it. Counts memory
+    hits, disk hits and misses so the hit rate can be reported after a run.
+    """
+
+    def __init__(self, path=".embedding_cache/embeddings.sqlite", model_name="", memory_items=4096):
+        self.path = path
+        self.model_name = model_name
+        self.memory_items = memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def key(self, text):
+        """Hash of the model name and the text with whitespace runs collapsed."""
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{self.model_name}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts):
+        """Return {text: vector} for the texts found in either tier."""
+        found = {}
+        missing = {}
+        with self._lock:
+            for text in texts:
+                key = self.key(text)
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[text] = vector
+                    self.memory_hits += 1
+                else:
+                    missing[key] = text
+
+            keys = list(missing)
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(key, vector)
+                    found[missing.pop(key)] = vector
+                    self.disk_hits += 1
+
+            self.misses += len(missing)
+        return found
+
+    def put_many(self, items):
+        """Store (text, vector) pairs in both tiers."""
+        rows = []
+        with self._lock:
+            for text, vector in items:
+                key = self.key(text)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, self.model_name, vector.tobytes()))
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, model, vector) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def clear(self):
+        """Drop every cached vector of this model."""
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM embeddings WHERE model = ?", (self.model_name,))
+            self._conn.commit()
+
+    def hit_rate(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def encode_batched(model, texts, batch_size=DEFAULT_BATCH_SIZE, dim=EMBEDDING_DIM, cache=None):
+    """
+    Encode a list of texts in large batches and return a (len(texts), dim) float32 array.
+    Empty strings map to zero vectors and repeated strings are encoded once. With a cache,
+    only texts missing from it are encoded, and their vectors are added to it. The unique
+    inputs are sorted by token length so each batch pads to a similar length, and the
+    vectors are scattered back to the original positions.
+    """
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+
+    positions = {}
+    for i, text in enumerate(texts):
+        if text:
+            positions.setdefault(text, []).append(i)
+    unique_texts = list(positions)
+
+    if cache is not None and unique_texts:
+        for text, vector in cache.get_many(unique_texts).items():
+            vectors[positions[text]] = vector
+            del positions[text]
+        unique_texts = list(positions)
+
+    if not unique_texts:
+        return vectors
+
+    lengths = _token_lengths(model, unique_texts)
+    order = sorted(range(len(unique_texts)), key=lengths.__getitem__)
+
+    for start in range(0, len(order), batch_size):
+        batch_ids = order[start:start + batch_size]
+        batch = [unique_texts[i] for i in batch_ids]
+        encoded = model.encode(batch, batch_size=len(batch), convert_to_numpy=True, show_progress_bar=False)
+        for i, vector in zip(batch_ids, encoded):
+            vectors[positions[unique_texts[i]]] = vector
+        if cache is not None:
+            cache.put_many(zip(batch, encoded))
+
+    return vectors
@@ -0,0 +1,265 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+
+import numpy as np
+
+
+class IngestionCache:
+    """
+    Content-addressed cache of ingestion artifacts, keyed by the SHA-256 of the PDF bytes.
+
+    Each entry keeps the parsed Markdown, the node JSON, the extracted images and the
+    node embeddings, so re-ingesting an unchanged PDF skips LlamaParse and the embedder.
+    Entries record the parser version and the embedding model (with the chunking
+    configuration) that produced them; a change invalidates the affected artifacts. The
+    cache is capped at max_bytes and evicts the least recently used entries first.
+    """
+
+    MANIFEST = "manifest.json"
+    MARKDOWN = "document.md"
+    JSON = "document.json"
+    EMBEDDINGS = "embeddings.npy"
+    IMAGES = "images"
+
+    def __init__(self, cache_dir=".ingest_cache", max_bytes=5 * 1024 ** 3, parser_version="", embedding_model=""):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.parser_version = parser_version
+        self.embedding_model = embedding_model
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def hash_file(path, chunk_size=1024 * 1024):
+        """Return the SHA-256 hex digest of a file's content."""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _read_manifest(self, key):
+        try:
+            with open(os.path.join(self._entry_dir(key), self.MANIFEST), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _write_manifest(self, entry_dir, manifest):
+        tmp_path = os.path.join(entry_dir, f"{self.MANIFEST}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(tmp_path, os.path.join(entry_dir, self.MANIFEST))
+
+    @staticmethod
+    def _dir_size(path):
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                total += os.path.getsize(os.path.join(root, name))
+        return total
+
+    def lookup(self, pdf_path):
+        """
+        Return (key, manifest) for a PDF. The manifest is None on a miss or when the entry
+        was produced by a different parser version. Embeddings from a different model are
+        dropped from the entry but its parse artifacts are kept.
+        """
+        key = self.hash_file(pdf_path)
+        with self._lock:
+            manifest = self._read_manifest(key)
+            if manifest is None:
+                return key, None
+
+            entry_dir = self._entry_dir(key)
+            if manifest.get("parser_version") != self.parser_version:
+                print(f"Ingestion cache entry {key[:12]} is stale (parser version changed). Discarding.")
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                return key, None
+
+            if manifest.get("embedding_model") != self.embedding_model and manifest.get("has_embeddings"):
+                print(f"Ingestion cache entry {key[:12]} has embeddings from another model or chunking. Dropping them.")
+                emb_path = os.path.join(entry_dir, self.EMBEDDINGS)
+                if os.path.exists(emb_path):
+                    os.remove(emb_path)
+                manifest["has_embeddings"] = False
+                manifest["embedding_model"] = ""
+
+            manifest["last_access"] = time.time()
+            self._write_manifest(entry_dir, manifest)
+            return key, manifest
+
+    def restore(self, key, manifest, md_path, json_path, image_folder):
+        """Copy a cached entry to the requested output paths, rewriting image locations."""
+        entry_dir = self._entry_dir(key)
+        old_image_folder = manifest["image_folder"]
+        new_image_folder = os.path.join(os.getcwd(), image_folder)
+
+        os.makedirs(new_image_folder, exist_ok=True)
+        cached_images = os.path.join(entry_dir, self.IMAGES)
+        for name in os.listdir(cached_images):
+            shutil.copy2(os.path.join(cached_images, name), os.path.join(new_image_folder, name))
+
+        with open(os.path.join(entry_dir, self.MARKDOWN), "r", encoding="utf-8") as f:
+            markdown = f.read().replace(old_image_folder, new_image_folder)
+        os.makedirs(os.path.dirname(md_path) or ".", exist_ok=True)
+        with open(md_path, "w", encoding="utf-8") as f:
+            f.write(markdown)
+
+        with open(os.path.join(entry_dir, self.JSON), "r", encoding="utf-8") as f:
+            nodes = json.load(f)
+
+        def relocate(node_list):
+            for node in node_list:
+                metadata = node.get("metadata", {})
+                if "image" in metadata:
+                    metadata["image"] = os.path.join(new_image_folder, os.path.basename(metadata["image"]))
+                relocate(node.get("subheadings", []))
+
+        relocate(nodes)
+        os.makedirs(os.path.dirname(json_path) or ".", exist_ok=True)
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(nodes, f, indent=4)
+
+        print(f"Restored {os.path.basename(json_path)} from ingestion cache ({key[:12]}).")
+
+    def load_embeddings(self, key, manifest):
+        """Return the cached embeddings array for an entry, or None."""
+        if not manifest or not manifest.get("has_embeddings"):
+            return None
+        try:
+            return np.load(os.path.join(self._entry_dir(key), self.EMBEDDINGS))
+        except OSError:
+            return None
+
+    def store(self, key, md_path, json_path, image_folder):
+        """Store the parse artifacts of a freshly ingested PDF, then enforce the size cap."""
+        image_folder = os.path.join(os.getcwd(), image_folder)
+        staging_dir = os.path.join(self.cache_dir, f".{key}.{uuid.uuid4().hex}.tmp")
+        os.makedirs(os.path.join(staging_dir, self.IMAGES))
+
+        shutil.copy2(md_path, os.path.join(staging_dir, self.MARKDOWN))
+        shutil.copy2(json_path, os.path.join(staging_dir, self.JSON))
+        if os.path.isdir(image_folder):
+            for name in os.listdir(image_folder):
+                src = os.path.join(image_folder, name)
+                if os.path.isfile(src):
+                    shutil.copy2(src, os.path.join(staging_dir, self.IMAGES, name))
+
+        now = time.time()
+        self._write_manifest(staging_dir, {
+            "parser_version": self.parser_version,
+            "embedding_model": "",
+            "has_embeddings": False,
+            "image_folder": image_folder,
+            "created": now,
+            "last_access": now,
+            "size": self._dir_size(staging_dir),
+        })
+
+        with self._lock:
+            entry_dir = self._entry_dir(key)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(staging_dir, entry_dir)
+        self.evict()
+
+    def store_embeddings(self, key, embeddings):
+        """Attach the node embeddings produced by the current model to an entry."""
+        if embeddings is None:
+            return
+        with self._lock:
+            manifest = self._read_manifest(key)
+            if manifest is None:
+                return
+            entry_dir = self._entry_dir(key)
+            tmp_path = os.path.join(entry_dir, f"embeddings.{uuid.uuid4().hex}.tmp.npy")
+            np.save(tmp_path, np.asarray(embeddings, dtype=np.float32))
+            os.replace(tmp_path, os.path.join(entry_dir, self.EMBEDDINGS))
+            manifest["has_embeddings"] = True
+            manifest["embedding_model"] = self.embedding_model
+            manifest["size"] = self._dir_size(entry_dir)
+            self._write_manifest(entry_dir, manifest)
+        self.evict()
+
+    def entries(self):
+        """Return (key, manifest) for every complete entry in the cache."""
+        result = []
+        for key in os.listdir(self.cache_dir):
+            if key.startswith("."):
+                continue
+            manifest = self._read_manifest(key)
+            if manifest is not None:
+                result.append((key, manifest))
+        return result
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = sorted(self.entries(), key=lambda item: item[1].get("last_access", 0))
+            total = sum(manifest.get("size", 0) for _, manifest in entries)
+            while entries and total > self.max_bytes:
+                key, manifest = entries.pop(0)
+                shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+                total -= manifest.get("size", 0)
+                print(f"Evicted ingestion cache entry {key[:12]}.")
+
+    def invalidate(self, all_entries=False):
+        """Drop every entry (or every entry built by another parser/model version)."""
+        removed = 0
+        with self._lock:
+            for key, manifest in self.entries():
+                stale_parse = manifest.get("parser_version") != self.parser_version
+                stale_embeddings = manifest.get("has_embeddings") and manifest.get("embedding_model") != self.embedding_model
+                if all_entries or stale_parse:
+                    shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+                    removed += 1
+                elif stale_embeddings:
+                    emb_path = os.path.join(self._entry_dir(key), self.EMBEDDINGS)
+                    if os.path.exists(emb_path):
+                        os.remove(emb_path)
+                    manifest["has_embeddings"] = False
+                    manifest["embedding_model"] = ""
+                    manifest["size"] = self._dir_size(self._entry_dir(key))
+                    self._write_manifest(self._entry_dir(key), manifest)
+        return removed
+
+
+def main():
+    from parser import PARSER_VERSION
+    from chunking import DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP_TOKENS, chunking_id, get_tokenizer
+    from embeddings import EMBEDDING_MODEL_NAME, embedding_id
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ("stats", "invalidate", "clear"):
+        print("Usage: python ingest_cache.py stats|invalidate|clear [<cache_dir>] [<parser_backend>]")
+        sys.exit(1)
+
+    cache_dir = sys.argv[2] if len(sys.argv) > 2 else ".ingest_cache"
+    parser_backend = sys.argv[3] if len(sys.argv) > 3 else "llamaparse"
+    # Cached embeddings are chunk vectors, so they are identified by the chunking configuration too.
+    max_tokens = int(os.getenv("CHUNK_MAX_TOKENS", DEFAULT_MAX_TOKENS))
+    chunks = chunking_id(get_tokenizer(EMBEDDING_MODEL_NAME) if max_tokens > 0 else None, max_tokens,
+                         int(os.getenv("CHUNK_OVERLAP_TOKENS", DEFAULT_OVERLAP_TOKENS)))
+    model = embedding_id(EMBEDDING_MODEL_NAME, os.getenv("EMBEDDING_BACKEND", "torch"))
+    cache = IngestionCache(cache_dir, parser_version=f"{PARSER_VERSION}-{parser_backend}",
+                           embedding_model=f"{model}#{chunks}")
+
+    if sys.argv[1] == "stats":
+        entries = cache.entries()
+        total = sum(manifest.get("size", 0) for _, manifest in entries)
+        print(f"Entries: {len(entries)}  Size: {total / 1024 ** 2:.1f} MB  Cap: {cache.max_bytes / 1024 ** 2:.1f} MB")
+    else:
+        removed = cache.invalidate(all_entries=sys.argv[1] == "clear")
+        print(f"Removed {removed} ingestion cache entries.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,652 @@
+import json
+import math
+import os
+import re
+import shutil
+import threading
+
+import numpy as np
+from pymilvus import CollectionSchema, DataType, FieldSchema
+
+# An embedded vector store implementing the subset of the pymilvus ORM API that Docfusion uses
+# (Collection, list_collections, utility, AnnSearchRequest and the rankers), so it can stand in
+# for a Milvus server on a laptop or in CI and serve as exact ground truth for Milvus results.
+# Vectors live in memory-mapped .npy files and are searched with exact inner product; an HNSW
+# index (hnswlib) is used for unfiltered searches when the field has one and hnswlib is installed.
+# A store directory is meant to be used by one process at a time.
+
+VECTOR_TYPES = (DataType.FLOAT_VECTOR, DataType.FLOAT16_VECTOR)
+
+_lock = threading.RLock()
+_open_collections = {}
+_store_path = ".local_store"
+
+
+def set_store_path(path):
+    """Point the store at another directory; collections opened so far are forgotten."""
+    global _store_path
+    with _lock:
+        _store_path = path
+        _open_collections.clear()
+
+
+def _root():
+    os.makedirs(_store_path, exist_ok=True)
+    return _store_path
+
+
+def list_collections(using="default", **kwargs):
+    root = _root()
+    return sorted(name for name in os.listdir(root) if os.path.exists(os.path.join(root, name, "schema.json")))
+
+
+# ---------------------------------------------------------------------------
+# Filter expressions
+# ---------------------------------------------------------------------------
+
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<number>-?\d+(?:\.\d+)?)
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<op>==|!=|>=|<=|>|<|&&|\|\||\(|\)|\[|\]|,)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+)""", re.VERBOSE)
+
+
+def _tokenize(expr):
+    tokens = []
+    position = 0
+    expr = expr.strip()
+    while position < len(expr):
+        match = _TOKEN.match(expr, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Cannot parse filter expression at: {expr[position:]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "number":
+            value = float(value) if "." in value else int(value)
+        elif kind == "string":
+            value = json.loads('"' + value[1:-1].replace('"', '\\"').replace("\\'", "'") + '"') \
+                if value[0] == "'" else json.loads(value)
+        elif kind == "op" and value in ("&&", "||"):
+            kind, value = "keyword", "and" if value == "&&" else "or"
+        elif kind == "word" and value.lower() in ("and", "or", "not", "in", "true", "false", "like"):
+            kind, value = "keyword", value.lower()
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+class FilterExpression:
+    """
+    Parser for the boolean expression subset used with Milvus here: comparisons (== != > >= < <=),
+    "in [...]", "not in [...]", "like" with a trailing %, and/or/not (also && and ||) and parentheses.
+    """
+
+    def __init__(self, expr):
+        self.tokens = _tokenize(expr or "")
+        self.position = 0
+        self.predicate = self._parse_or() if self.tokens else (lambda row: True)
+        if self.position != len(self.tokens):
+            raise ValueError(f"Unexpected token {self.tokens[self.position][1]!r} in filter expression.")
+
+    def __call__(self, row):
+        return self.predicate(row)
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def _take(self, value=None):
+        kind, token = self._peek()
+        if value is not None and token != value:
+            raise ValueError(f"Expected {value!r} in filter expression, got {token!r}.")
+        self.position += 1
+        return kind, token
+
+    def _parse_or(self):
+        left = self._parse_and()
+        while self._peek() == ("keyword", "or"):
+            self._take()
+            right = self._parse_and()
+            left = (lambda a, b: lambda row: a(row) or b(row))(left, right)
+        return left
+
+    def _parse_and(self):
+        left = self._parse_not()
+        while self._peek() == ("keyword", "and"):
+            self._take()
+            right = self._parse_not()
+            left = (lambda a, b: lambda row: a(row) and b(row))(left, right)
+        return left
+
+    def _parse_not(self):
+        if self._peek() == ("keyword", "not"):
+            self._take()
+            inner = self._parse_not()
+            return lambda row: not inner(row)
+        if self._peek() == ("op", "("):
+            self._take()
+            inner = self._parse_or()
+            self._take(")")
+            return inner
+        return self._parse_comparison()
+
+    def _parse_literal(self):
+        kind, value = self._take()
+        if kind in ("number", "string"):
+            return value
+        if kind == "keyword" and value in ("true", "false"):
+            return value == "true"
+        if kind == "op" and value == "[":
+            values = []
+            while self._peek() != ("op", "]"):
+                values.append(self._parse_literal())
+                if self._peek() == ("op", ","):
+                    self._take()
+            self._take("]")
+            return values
+        raise ValueError(f"Expected a literal in filter expression, got {value!r}.")
+
+    def _parse_comparison(self):
+        kind, field = self._take()
+        if kind != "word":
+            raise ValueError(f"Expected a field name in filter expression, got {field!r}.")
+        negate = False
+        if self._peek() == ("keyword", "not"):
+            self._take()
+            negate = True
+        kind, op = self._take()
+        value = self._parse_literal()
+
+        if op == "in":
+            members = set(value)
+            return (lambda row: row.get(field) not in members) if negate else (lambda row: row.get(field) in members)
+        if op == "like":
+            prefix = value.rstrip("%")
+            return lambda row: str(row.get(field, "")).startswith(prefix)
+        comparisons = {
+            "==": lambda a, b: a == b, "!=": lambda a, b: a != b,
+            ">": lambda a, b: a > b, ">=": lambda a, b: a >= b,
+            "<": lambda a, b: a < b, "<=": lambda a, b: a <= b,
+        }
+        if op not in comparisons:
+            raise ValueError(f"Unsupported operator {op!r} in filter expression.")
+        compare = comparisons[op]
+        return lambda row: row.get(field) is not None and compare(row.get(field), value)
+
+
+# ---------------------------------------------------------------------------
+# Search results and rankers
+# ---------------------------------------------------------------------------
+
+class Hit:
+    def __init__(self, id, distance, entity):
+        self.id = id
+        self.distance = distance
+        self.score = distance
+        self.entity = entity
+
+    def get(self, field):
+        return self.entity.get(field)
+
+
+class AnnSearchRequest:
+    def __init__(self, data, anns_field, param, limit, expr=None):
+        self.data = data
+        self.anns_field = anns_field
+        self.param = param
+        self.limit = limit
+        self.expr = expr
+
+
+class RRFRanker:
+    def __init__(self, k=60):
+        self.k = k
+
+    def fuse(self, ranked_lists):
+        scores = {}
+        for hits in ranked_lists:
+            for rank, (row_id, _) in enumerate(hits, start=1):
+                scores[row_id] = scores.get(row_id, 0.0) + 1.0 / (self.k + rank)
+        return scores
+
+
+class WeightedRanker:
+    def __init__(self, *weights):
+        self.weights = weights
+
+    def fuse(self, ranked_lists):
+        # Milvus normalizes inner-product scores with arctan before weighting.
+        scores = {}
+        for weight, hits in zip(self.weights, ranked_lists):
+            for row_id, distance in hits:
+                scores[row_id] = scores.get(row_id, 0.0) + weight * (0.5 + math.atan(distance) / math.pi)
+        return scores
+
+
+class _Index:
+    def __init__(self, field_name, params):
+        self.field_name = field_name
+        self.index_name = field_name
+        self.params = params
+
+
+class _QueryIterator:
+    def __init__(self, rows, batch_size):
+        self.rows = rows
+        self.batch_size = batch_size
+        self.offset = 0
+
+    def next(self):
+        batch = self.rows[self.offset:self.offset + self.batch_size]
+        self.offset += self.batch_size
+        return batch
+
+    def close(self):
+        self.rows = []
+
+
+# ---------------------------------------------------------------------------
+# Collections
+# ---------------------------------------------------------------------------
+
+def _schema_to_dict(schema):
+    return {
+        "description": schema.description,
+        "fields": [{
+            "name": field.name,
+            "dtype": field.dtype.name,
+            "is_primary": field.is_primary,
+            "auto_id": getattr(field, "auto_id", False),
+            "is_partition_key": getattr(field, "is_partition_key", False),
+            "params": {key: value for key, value in field.params.items() if key in ("dim", "max_length")},
+        } for field in schema.fields],
+    }
+
+
+def _schema_from_dict(data):
+    fields = []
+    for field in data["fields"]:
+        kwargs = dict(field["params"])
+        if field["is_primary"]:
+            kwargs["auto_id"] = field["auto_id"]
+        if field["is_partition_key"]:
+            kwargs["is_partition_key"] = True
+        fields.append(FieldSchema(name=field["name"], dtype=DataType[field["dtype"]], is_primary=field["is_primary"],
+                                  **kwargs))
+    return CollectionSchema(fields, description=data["description"])
+
+
+class _CollectionData:
+    """On-disk state of one collection, shared by every Collection handle in the process."""
+
+    def __init__(self, name, schema=None):
+        self.name = name
+        self.path = os.path.join(_root(), name)
+        self.lock = threading.RLock()
+        self.hnsw = {}
+        if schema is not None:
+            os.makedirs(self.path, exist_ok=True)
+            self.schema = schema
+            self.meta = {"indexes": {}, "next_auto_id": 1, "loaded": False}
+            self.rows = []
+            self.vectors = {}
+            self._write_json("schema.json", _schema_to_dict(schema))
+            self.flush()
+        else:
+            with open(os.path.join(self.path, "schema.json"), "r", encoding="utf-8") as f:
+                self.schema = _schema_from_dict(json.load(f))
+            with open(os.path.join(self.path, "meta.json"), "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+            with open(os.path.join(self.path, "rows.json"), "r", encoding="utf-8") as f:
+                self.rows = json.load(f)
+            self.vectors = {}
+            for field in self.vector_fields():
+                vector_path = os.path.join(self.path, f"{field.name}.npy")
+                if os.path.exists(vector_path):
+                    self.vectors[field.name] = np.load(vector_path, mmap_mode="r+")
+        self.positions = {row["id"]: i for i, row in enumerate(self.rows) if row is not None}
+
+    def vector_fields(self):
+        return [field for field in self.schema.fields if field.dtype in VECTOR_TYPES]
+
+    def _write_json(self, name, data):
+        tmp_path = os.path.join(self.path, f"{name}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, os.path.join(self.path, name))
+
+    def close_vectors(self, name=None):
+        """
+        Flush and unmap the vector files (or one field's), so they can be replaced or removed;
+        Windows refuses to replace a file that is still mapped.
+        """
+        for field_name in [name] if name else list(self.vectors):
+            array = self.vectors.pop(field_name, None)
+            if array is not None:
+                array.flush()
+                array._mmap.close()
+
+    def _ensure_capacity(self, field, needed):
+        array = self.vectors.get(field.name)
+        if array is not None and array.shape[0] >= needed:
+            return array
+        capacity = max(1024, needed, 2 * (array.shape[0] if array is not None else 0))
+        dtype = np.float16 if field.dtype == DataType.FLOAT16_VECTOR else np.float32
+        vector_path = os.path.join(self.path, f"{field.name}.npy")
+        tmp_path = os.path.join(self.path, f"{field.name}.grow.npy")
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=(capacity, field.params["dim"]))
+        if array is not None:
+            grown[:len(self.rows)] = array[:len(self.rows)]
+            del array
+            self.close_vectors(field.name)
+        grown.flush()
+        grown._mmap.close()
+        del grown
+        os.replace(tmp_path, vector_path)
+        self.vectors[field.name] = np.load(vector_path, mmap_mode="r+")
+        return self.vectors[field.name]
+
+    def flush(self):
+        with self.lock:
+            live = sum(row is not None for row in self.rows)
+            if self.rows and live < len(self.rows) // 2:
+                self._compact()
+            for array in self.vectors.values():
+                array.flush()
+            self._write_json("rows.json", self.rows)
+            self._write_json("meta.json", self.meta)
+
+    def _compact(self):
+        keep = [i for i, row in enumerate(self.rows) if row is not None]
+        for field in self.vector_fields():
+            array = self.vectors.get(field.name)
+            if array is not None:
+                array[:len(keep)] = array[keep]
+        self.rows = [self.rows[i] for i in keep]
+        self.positions = {row["id"]: i for i, row in enumerate(self.rows)}
+        self.hnsw.clear()
+
+
+class Collection:
+    def __init__(self, name, schema=None, using="default", **kwargs):
+        with _lock:
+            data = _open_collections.get(name)
+            if schema is not None and name not in list_collections():
+                data = _CollectionData(name, schema)
+                _open_collections[name] = data
+            elif data is None:
+                if name not in list_collections():
+                    raise ValueError(f"Collection '{name}' does not exist in the local store.")
+                data = _CollectionData(name)
+                _open_collections[name] = data
+        self._data = data
+        self.name = name
+
+    @property
+    def schema(self):
+        return self._data.schema
+
+    @property
+    def description(self):
+        return self._data.schema.description
+
+    @property
+    def num_entities(self):
+        return sum(row is not None for row in self._data.rows)
+
+    @property
+    def indexes(self):
+        return [_Index(field, params) for field, params in self._data.meta["indexes"].items()]
+
+    def load(self):
+        self._data.meta["loaded"] = True
+
+    def release(self):
+        self._data.meta["loaded"] = False
+        self._data.hnsw.clear()
+
+    def flush(self):
+        self._data.flush()
+
+    def create_index(self, field_name, index_params, **kwargs):
+        with self._data.lock:
+            self._data.meta["indexes"][field_name] = dict(index_params)
+            self._data.hnsw.pop(field_name, None)
+            self._data.flush()
+
+    def _columns_to_rows(self, columns):
+        data = self._data
+        fields = [field for field in data.schema.fields if not (field.is_primary and getattr(field, "auto_id", False))]
+        if len(columns) != len(fields):
+            raise ValueError(f"Expected {len(fields)} columns for '{self.name}', got {len(columns)}.")
+        count = len(columns[0]) if columns else 0
+        rows = [{} for _ in range(count)]
+        vectors = {}
+        for field, column in zip(fields, columns):
+            if field.dtype in VECTOR_TYPES:
+                vectors[field.name] = np.asarray([np.asarray(v, dtype=np.float32) for v in column], dtype=np.float32)
+            else:
+                for row, value in zip(rows, column):
+                    row[field.name] = value.item() if isinstance(value, np.generic) else value
+        primary = next(field for field in data.schema.fields if field.is_primary)
+        if getattr(primary, "auto_id", False):
+            for row in rows:
+                row[primary.name] = data.meta["next_auto_id"]
+                data.meta["next_auto_id"] += 1
+        return primary.name, rows, vectors
+
+    def insert(self, columns):
+        data = self._data
+        with data.lock:
+            primary, rows, vectors = self._columns_to_rows(columns)
+            start = len(data.rows)
+            for field in data.vector_fields():
+                array = data._ensure_capacity(field, start + len(rows))
+                if field.name in vectors and len(rows):
+                    array[start:start + len(rows)] = vectors[field.name]
+            for offset, row in enumerate(rows):
+                old = data.positions.get(row[primary])
+                if old is not None:
+                    data.rows[old] = None
+                data.rows.append(row)
+                data.positions[row[primary]] = start + offset
+            data.hnsw.clear()
+        return len(rows)
+
+    def upsert(self, columns):
+        return self.insert(columns)
+
+    def delete(self, expr):
+        data = self._data
+        predicate = FilterExpression(expr)
+        with data.lock:
+            deleted = 0
+            for position, row in enumerate(data.rows):
+                if row is not None and predicate(row):
+                    data.rows[position] = None
+                    data.positions.pop(row["id"], None)
+                    deleted += 1
+            data.hnsw.clear()
+        return deleted
+
+    def _row_entity(self, position, output_fields):
+        row = self._data.rows[position]
+        entity = {}
+        for field in output_fields or []:
+            if field in self._data.vectors:
+                entity[field] = self._data.vectors[field][position].astype(np.float32).tolist()
+            else:
+                entity[field] = row.get(field)
+        return entity
+
+    def _matching_positions(self, expr):
+        predicate = FilterExpression(expr)
+        return [position for position, row in enumerate(self._data.rows) if row is not None and predicate(row)]
+
+    def query(self, expr="", output_fields=None, limit=None, **kwargs):
+        with self._data.lock:
+            positions = self._matching_positions(expr)
+            if output_fields == ["count(*)"]:
+                return [{"count(*)": len(positions)}]
+            if limit is not None:
+                positions = positions[:limit]
+            # Like Milvus, queries always return the primary key.
+            primary = next(field.name for field in self._data.schema.fields if field.is_primary)
+            output_fields = [primary] + [field for field in output_fields or [] if field != primary]
+            return [self._row_entity(position, output_fields) for position in positions]
+
+    def query_iterator(self, batch_size=1000, limit=-1, expr=None, output_fields=None, **kwargs):
+        rows = self.query(expr=expr or "", output_fields=output_fields)
+        if limit is not None and limit >= 0:
+            rows = rows[:limit]
+        return _QueryIterator(rows, batch_size)
+
+    def _hnsw_index(self, field_name):
+        """An hnswlib index over the live rows of a field, or None if unavailable."""
+        params = self._data.meta["indexes"].get(field_name, {})
+        if params.get("index_type") != "HNSW":
+            return None
+        try:
+            import hnswlib
+        except ImportError:
+            return None
+        index = self._data.hnsw.get(field_name)
+        if index is None:
+            positions = [position for position, row in enumerate(self._data.rows) if row is not None]
+            if not positions:
+                return None
+            vectors = np.asarray(self._data.vectors[field_name][positions], dtype=np.float32)
+            index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+            index.init_index(max_elements=len(positions), M=params["params"].get("M", 16),
+                             ef_construction=params["params"].get("efConstruction", 200))
+            index.add_items(vectors, np.asarray(positions))
+            self._data.hnsw[field_name] = index
+        return index
+
+    def _ranked(self, vector, anns_field, param, limit, expr, exact=False):
+        """
+        (position, distance) pairs of the best matches, most similar first. Like a Milvus range
+        search, radius and range_filter in the search params keep radius < distance <= range_filter.
+        """
+        data = self._data
+        query = np.asarray(vector, dtype=np.float32)
+        search_params = (param or {}).get("params", {})
+        radius = search_params.get("radius")
+        range_filter = search_params.get("range_filter")
+
+        def in_range(distance):
+            return (radius is None or distance > radius) and (range_filter is None or distance <= range_filter)
+
+        index = None if expr or exact or radius is not None else self._hnsw_index(anns_field)
+        if index is not None:
+            index.set_ef(max(search_params.get("ef", 128), limit))
+            labels, distances = index.knn_query(query, k=min(limit, index.get_current_count()))
+            # hnswlib reports 1 - inner product for the "ip" space.
+            return [(int(label), 1.0 - float(distance)) for label, distance in zip(labels[0], distances[0])
+                    if in_range(1.0 - float(distance))]
+
+        positions = self._matching_positions(expr)
+        if not positions or anns_field not in data.vectors:
+            return []
+        scores = np.asarray(data.vectors[anns_field][positions], dtype=np.float32) @ query
+        order = np.argsort(-scores, kind="stable")
+        return [(positions[i], float(scores[i])) for i in order if in_range(float(scores[i]))]
+
+    def search(self, data, anns_field, param, limit, expr=None, output_fields=None, group_by_field=None,
+               group_size=1, **kwargs):
+        results = []
+        with self._data.lock:
+            for vector in data:
+                # Grouped searches rank every candidate exactly so each group gets its best hits.
+                ranked = self._ranked(vector, anns_field, param, limit, expr, exact=bool(group_by_field))
+                hits = []
+                if group_by_field:
+                    groups = {}
+                    for position, distance in ranked:
+                        key = self._data.rows[position].get(group_by_field)
+                        if key not in groups and len(groups) >= limit:
+                            continue
+                        members = groups.setdefault(key, [])
+                        if len(members) < group_size:
+                            members.append(position)
+                            hits.append(Hit(self._data.rows[position]["id"], distance,
+                                            self._row_entity(position, output_fields)))
+                else:
+                    for position, distance in ranked[:limit]:
+                        hits.append(Hit(self._data.rows[position]["id"], distance,
+                                        self._row_entity(position, output_fields)))
+                results.append(hits)
+        return results
+
+    def hybrid_search(self, reqs, rerank, limit, output_fields=None, **kwargs):
+        results = []
+        with self._data.lock:
+            for query_index in range(len(reqs[0].data)):
+                ranked_lists = []
+                for request in reqs:
+                    ranked = self._ranked(request.data[query_index], request.anns_field, request.param,
+                                          request.limit, request.expr)[:request.limit]
+                    ranked_lists.append([(self._data.rows[position]["id"], distance) for position, distance in ranked])
+                scores = rerank.fuse(ranked_lists)
+                best = sorted(scores, key=lambda row_id: -scores[row_id])[:limit]
+                results.append([Hit(row_id, scores[row_id],
+                                    self._row_entity(self._data.positions[row_id], output_fields))
+                                for row_id in best])
+        return results
+
+
+class _LoadState:
+    def __init__(self, loaded):
+        self.name = "Loaded" if loaded else "NotLoad"
+
+
+class _Segment:
+    def __init__(self, num_rows, mem_size):
+        self.num_rows = num_rows
+        self.mem_size = mem_size
+
+
+class _Utility:
+    """Counterpart of pymilvus.utility for the local store."""
+
+    @staticmethod
+    def has_collection(collection_name, using="default", **kwargs):
+        return collection_name in list_collections()
+
+    @staticmethod
+    def drop_collection(collection_name, using="default", **kwargs):
+        with _lock:
+            data = _open_collections.pop(collection_name, None)
+            if data is not None:
+                with data.lock:
+                    data.close_vectors()
+            shutil.rmtree(os.path.join(_root(), collection_name), ignore_errors=True)
+
+    @staticmethod
+    def load_state(collection_name, using="default", **kwargs):
+        return _LoadState(Collection(collection_name)._data.meta.get("loaded", False))
+
+    @staticmethod
+    def index_building_progress(collection_name, index_name="", using="default", **kwargs):
+        rows = Collection(collection_name).num_entities
+        return {"total_rows": rows, "indexed_rows": rows, "pending_index_rows": 0}
+
+    @staticmethod
+    def get_query_segment_info(collection_name, using="default", **kwargs):
+        collection = Collection(collection_name)
+        rows = collection.num_entities
+        row_bytes = sum(array.shape[1] * array.itemsize for array in collection._data.vectors.values())
+        return [_Segment(rows, rows * row_bytes)]
+
+
+utility = _Utility()
+
+
+class LocalClient:
+    """The MilvusClient methods app.py uses, backed by the local store."""
+
+    def list_collections(self):
+        return list_collections()
+
+    def drop_collection(self, collection_name):
+        utility.drop_collection(collection_name)
@@ -0,0 +1,216 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pymilvus
+from dotenv import load_dotenv
+from pymilvus import connections, MilvusClient
+
+import local_store
+
+# milvus: a Milvus server (or Milvus Lite when MILVUS_URI is a local .db file).
+# local: the embedded store in local_store.py, no server needed.
+VECTOR_STORES = ("milvus", "local")
+
+
+class MilvusConfig:
+    """
+    Milvus connection settings, read once from the environment (and .env):
+    MILVUS_URI, or MILVUS_HOST and MILVUS_PORT; MILVUS_TOKEN; MILVUS_DB_NAME;
+    MILVUS_LOADED_BYTES_BUDGET, the memory budget for collections kept loaded; and
+    VECTOR_STORE with LOCAL_STORE_PATH to use the embedded local store instead of Milvus.
+    """
+
+    def __init__(self, host=None, port=None, uri=None, token=None, db_name=None, loaded_bytes_budget=None,
+                 store=None, local_store_path=None):
+        load_dotenv()
+        self.store = store or os.getenv("VECTOR_STORE", "milvus")
+        if self.store not in VECTOR_STORES:
+            raise ValueError(f"Unknown vector store '{self.store}'. Choose one of {VECTOR_STORES}.")
+        self.local_store_path = local_store_path or os.getenv("LOCAL_STORE_PATH", ".local_store")
+        self.host = host or os.getenv("MILVUS_HOST", "host.docker.internal")
+        self.port = str(port or os.getenv("MILVUS_PORT", "19530"))
+        self.uri = uri or os.getenv("MILVUS_URI") or f"http://{self.host}:{self.port}"
+        self.token = token if token is not None else os.getenv("MILVUS_TOKEN", "root:Milvus")
+        self.db_name = db_name or os.getenv("MILVUS_DB_NAME", "default")
+        self.loaded_bytes_budget = int(loaded_bytes_budget or os.getenv("MILVUS_LOADED_BYTES_BUDGET", 8 * 1024 ** 3))
+
+    def key(self):
+        if self.store == "local":
+            return self.store, self.local_store_path
+        return self.uri, self.token, self.db_name
+
+    def api(self):
+        """The module providing Collection, list_collections, utility and the search helpers."""
+        return local_store if self.store == "local" else pymilvus
+
+
+class MilvusConnectionPool:
+    """
+    Process-wide pool of Milvus connections. Each distinct configuration is connected once,
+    under its own alias, and shared by every MilvusEmbeddingManager and MilvusClient user.
+    """
+
+    _lock = threading.Lock()
+    _aliases = {}
+    _clients = {}
+
+    @classmethod
+    def connect(cls, config=None):
+        """Connect the ORM API for a configuration once and return its alias."""
+        config = config or MilvusConfig()
+        key = config.key()
+        with cls._lock:
+            alias = cls._aliases.get(key)
+            if alias is None and config.store == "local":
+                local_store.set_store_path(config.local_store_path)
+                alias = cls._aliases[key] = "local"
+                print(f"Using the local vector store in {config.local_store_path}.")
+            elif alias is None:
+                alias = "default" if not cls._aliases else f"docfusion-{len(cls._aliases)}"
+                connections.connect(alias, uri=config.uri, token=config.token, db_name=config.db_name)
+                cls._aliases[key] = alias
+                print(f"Connected to Milvus at {config.uri}.")
+        return alias
+
+    @classmethod
+    def client(cls, config=None):
+        """A shared MilvusClient for a configuration."""
+        config = config or MilvusConfig()
+        key = config.key()
+        with cls._lock:
+            client = cls._clients.get(key)
+            if client is None and config.store == "local":
+                local_store.set_store_path(config.local_store_path)
+                client = cls._clients[key] = local_store.LocalClient()
+            elif client is None:
+                client = MilvusClient(uri=config.uri, token=config.token, db_name=config.db_name)
+                cls._clients[key] = client
+        return client
+
+
+class LoadedCollections:
+    """
+    Collections this process has loaded into query node memory, in least recently used
+    order. Each collection is loaded once and kept warm; when the estimated memory of the
+    loaded collections exceeds the budget, the coldest ones are released. Collections in
+    use (see use) are never released, so concurrent searches cannot unload each other's.
+    """
+
+    def __init__(self, bytes_budget, estimate_bytes):
+        self.bytes_budget = bytes_budget
+        self.estimate_bytes = estimate_bytes
+        self._lock = threading.Lock()
+        self._loaded = OrderedDict()
+        self._name_locks = {}
+        self._pins = {}
+
+    def _touch(self, name, pin):
+        entry = self._loaded.get(name)
+        if entry is not None:
+            self._loaded.move_to_end(name)
+            if pin:
+                self._pins[name] = self._pins.get(name, 0) + 1
+            return entry[0]
+        return None
+
+    def get(self, name, open_collection, pin=False):
+        """
+        Return the loaded collection, opening it with open_collection(name) and loading it on
+        first use. A pinned collection stays loaded until unpin(name) is called.
+        """
+        with self._lock:
+            collection = self._touch(name, pin)
+            if collection is not None:
+                return collection
+            name_lock = self._name_locks.setdefault(name, threading.Lock())
+
+        with name_lock:
+            with self._lock:
+                collection = self._touch(name, pin)
+                if collection is not None:
+                    return collection
+            collection = open_collection(name)
+            collection.load()
+            size = self.estimate_bytes(collection)
+
+            with self._lock:
+                self._loaded[name] = (collection, size)
+                if pin:
+                    self._pins[name] = self._pins.get(name, 0) + 1
+                evicted = self._evict(keep=name)
+        self._release(evicted)
+        return collection
+
+    def unpin(self, name):
+        """Allow a collection pinned by get to be released again, once no one else uses it."""
+        with self._lock:
+            count = self._pins.get(name, 0) - 1
+            if count > 0:
+                self._pins[name] = count
+                return
+            self._pins.pop(name, None)
+            evicted = self._evict()
+        self._release(evicted)
+
+    @contextmanager
+    def use(self, name, open_collection):
+        """The loaded collection, pinned for the duration of the with block."""
+        collection = self.get(name, open_collection, pin=True)
+        try:
+            yield collection
+        finally:
+            self.unpin(name)
+
+    def _evict(self, keep=None):
+        """
+        Untrack the coldest collections until the rest fit the budget; called with the lock
+        held. Returns them with their name locks held, to be released by _release once the
+        lock is dropped, so a slow release never blocks lookups of other collections.
+        """
+        # Pinned collections are skipped; the budget is enforced again as they are unpinned.
+        # So are collections being loaded by another thread, which hold their name lock.
+        evicted = []
+        total = sum(size for _, size in self._loaded.values())
+        for name in list(self._loaded):
+            if total <= self.bytes_budget:
+                break
+            if name == keep or name in self._pins:
+                continue
+            name_lock = self._name_locks.setdefault(name, threading.Lock())
+            if not name_lock.acquire(blocking=False):
+                continue
+            collection, size = self._loaded.pop(name)
+            evicted.append((name, collection, size, name_lock))
+            total -= size
+        return evicted
+
+    @staticmethod
+    def _release(evicted):
+        # A get of an evicted collection waits on its name lock until the release is done,
+        # so it loads the collection again instead of using one about to be released.
+        for name, collection, size, name_lock in evicted:
+            try:
+                collection.release()
+                print(f"Released cold collection '{name}' ({size / 1024 ** 2:.0f} MB estimated).")
+            finally:
+                name_lock.release()
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._loaded
+
+    def forget(self, name):
+        """Stop tracking a collection, e.g. after it was dropped or re-created."""
+        with self._lock:
+            self._loaded.pop(name, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loaded": list(self._loaded),
+                "estimated_bytes": sum(size for _, size in self._loaded.values()),
+                "in_use": dict(self._pins),
+                "bytes_budget": self.bytes_budget,
+            }
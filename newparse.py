@@ -1,10 +1,8 @@
 import json
 
-from pymilvus import connections, FieldSchema, CollectionSchema, DataType, Collection, utility
-from sentence_transformers import SentenceTransformer
-
-# Initialize the embedding model
-embedder = SentenceTransformer('embaas/sentence-transformers-e5-large-v2')
+from embeddings import encode_batched, get_embedding_model
+from milvus_connection import MilvusConfig, MilvusConnectionPool
+from pymilvus import FieldSchema, CollectionSchema, DataType
 
 def md_to_json(md_file_path):
     """Convert markdown file to structured JSON format"""
@@ -40,11 +38,13 @@ def md_to_json(md_file_path):
 def create_or_load_collection():
     """Check if collection exists; if not, create it"""
     collection_name = "md_embeddings"
-    connections.connect("default", host="localhost", port="19530")
+    config = MilvusConfig(host="localhost")
+    alias = MilvusConnectionPool.connect(config)
+    store = config.api()
 
-    if utility.has_collection(collection_name):
+    if store.utility.has_collection(collection_name, using=alias):
         print(f"Collection '{collection_name}' already exists. Loading it.")
-        return Collection(name=collection_name)  # Load existing collection
+        return store.Collection(name=collection_name, using=alias)  # Load existing collection
     
     print(f"Creating new collection: {collection_name}")
 
@@ -56,7 +56,7 @@ def create_or_load_collection():
         FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535),
     ], description="Embeddings collection for markdown files")
 
-    collection = Collection(name=collection_name, schema=schema)
+    collection = store.Collection(name=collection_name, schema=schema, using=alias)
     return collection
 
 def create_indexes(collection):
@@ -76,20 +76,22 @@ def create_indexes(collection):
 
 def generate_embeddings(text):
     """Generate embeddings for the given text"""
-    return embedder.encode(text).tolist() if text else [0.0] * 1024
+    return get_embedding_model().encode(text).tolist() if text else [0.0] * 1024
 
-def insert_data_into_milvus(collection, json_data):
+def insert_data_into_milvus(collection, json_data, batch_size=64):
     """Insert data into Milvus collection with generated embeddings"""
-    main_title_embeddings = []
-    section_title_embeddings = []
-    content_embeddings = []
-    texts = []
-    
+    texts = [data["content"] for data in json_data]
+
+    # Encode every field of every section in one batched, length-sorted pass
+    fields = []
     for data in json_data:
-        main_title_embeddings.append(generate_embeddings(data["main title"]))
-        section_title_embeddings.append(generate_embeddings(data["section title"]))
-        content_embeddings.append(generate_embeddings(data["content"]))
-        texts.append(data["content"])
+        fields.extend([data["main title"], data["section title"], data["content"]])
+    vectors = encode_batched(get_embedding_model(), fields, batch_size=batch_size)
+    vectors = vectors.reshape(len(json_data), 3, vectors.shape[-1])
+
+    main_title_embeddings = vectors[:, 0].tolist()
+    section_title_embeddings = vectors[:, 1].tolist()
+    content_embeddings = vectors[:, 2].tolist()
     
     entities = [main_title_embeddings, section_title_embeddings, content_embeddings, texts]
     
@@ -101,9 +103,10 @@ def query(query_text, anns_field="section_title_embedding", limit=1, threshold=0
     """Query the Milvus collection with a given text and filter results based on similarity threshold"""
     
     collection_name = "md_embeddings"
-    connections.connect("default", host="localhost", port="19530")
+    config = MilvusConfig(host="localhost")
+    alias = MilvusConnectionPool.connect(config)
 
-    collection = Collection(name=collection_name)
+    collection = config.api().Collection(name=collection_name, using=alias)
 
     collection.load()
 
@@ -1,26 +1,78 @@
+import bisect
 import fitz
+import hashlib
 import json
+import math
+import multiprocessing
 import os
 import nest_asyncio
 import re
 
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
 from dotenv import load_dotenv
+from embeddings import DEFAULT_BATCH_SIZE, EMBEDDING_MODEL_NAME, encode_batched, get_embedding_model
 from llama_parse import LlamaParse
 # from llama_index.embeddings.nvidia import NVIDIAEmbedding
-from sentence_transformers import SentenceTransformer
 
 
 nest_asyncio.apply()
 
+# Bump whenever a change alters the Markdown, images or node JSON produced for a PDF,
+# so cached ingestion artifacts built by the old parser are invalidated.
+PARSER_VERSION = "2"
+
+PARSER_BACKENDS = ("llamaparse", "pymupdf")
+
+
+class TextBlockIndex:
+    """
+    Vertical interval index over the text blocks of a page, as returned by
+    page.get_text("blocks"). Blocks are sorted once by their bottom edge and once by
+    their top edge, so the blocks whose edges lie near an image are found by bisection.
+    """
+
+    def __init__(self, text_blocks):
+        self.blocks = list(text_blocks)
+        by_bottom = sorted(range(len(self.blocks)), key=lambda i: self.blocks[i][3])
+        by_top = sorted(range(len(self.blocks)), key=lambda i: self.blocks[i][1])
+        self._bottoms = [self.blocks[i][3] for i in by_bottom]
+        self._bottom_order = by_bottom
+        self._tops = [self.blocks[i][1] for i in by_top]
+        self._top_order = by_top
+
+    def near(self, bbox, distance):
+        """
+        Returns, in page order, the blocks whose bottom edge lies within distance of the
+        top of bbox or whose top edge lies within distance of the bottom of bbox.
+        """
+        # Widen slightly so float rounding never drops a block the exact test would keep
+        margin = distance * 1e-9 + 1e-9
+        indices = set()
+        lo = bisect.bisect_left(self._bottoms, bbox.y0 - distance - margin)
+        hi = bisect.bisect_right(self._bottoms, bbox.y0 + distance + margin)
+        indices.update(self._bottom_order[lo:hi])
+        lo = bisect.bisect_left(self._tops, bbox.y1 - distance - margin)
+        hi = bisect.bisect_right(self._tops, bbox.y1 + distance + margin)
+        indices.update(self._top_order[lo:hi])
+        return [self.blocks[i] for i in sorted(indices)]
+
 
 class LlamaPDFParser:
-    def __init__(self, pdf_path, output_md_path, output_json_path, image_output_folder):
+    def __init__(self, pdf_path, output_md_path, output_json_path, image_output_folder, backend="llamaparse",
+                 extraction_workers=1, parallel_min_pages=32, embedding_cache=None, embedding_backend="torch"):
+        if backend not in PARSER_BACKENDS:
+            raise ValueError(f"Unknown parser backend '{backend}'. Choose one of {PARSER_BACKENDS}.")
+        self.backend = backend
+
         load_dotenv()
         self.api_key = os.getenv("LLAMA_CLOUD_API_KEY")
 #        self.nim_api_key = os.getenv("NIM_API_KEY")
-        if not self.api_key:
-            raise ValueError("API key for Llama Cloud is not set in the .env file.")
-        os.environ["LLAMA_CLOUD_API_KEY"] = self.api_key
+        if self.backend == "llamaparse":
+            if not self.api_key:
+                raise ValueError("API key for Llama Cloud is not set in the .env file.")
+            os.environ["LLAMA_CLOUD_API_KEY"] = self.api_key
 #        os.environ["NIM_API_KEY"] = self.nim_api_key
 
         # self.embedding_model = NVIDIAEmbedding(
@@ -28,42 +80,60 @@ class LlamaPDFParser:
         #     truncate="END",
         #     api_key=self.nim_api_key
         # )
-        self.embedding_model = SentenceTransformer('embaas/sentence-transformers-e5-large-v2')
+        self.embedding_model_name = EMBEDDING_MODEL_NAME
+        self.embedding_backend = embedding_backend
 
         self.pdf_path = pdf_path
         self.output_md_path = output_md_path
         self.output_json_path = output_json_path
         self.image_output_path = image_output_folder
+        self.extraction_workers = extraction_workers
+        self.parallel_min_pages = parallel_min_pages
+        self.embedding_cache = embedding_cache
+        self.page_text_lines = []
         self.documents, self.images_with_caption = self._parse_pdf_to_markdown()
 
+    @property
+    def embedding_model(self):
+        """The process-wide shared embedding model, loaded on first use."""
+        return get_embedding_model(self.embedding_model_name, self.embedding_backend)
+
     def _clean_heading(self, heading):
         """Helper function to clean and normalize headings."""
         return heading.strip("# ").strip()
 
     def _parse_pdf_to_markdown(self):
         """
-        Parses the input PDF file using LlamaParse and saves it as a Markdown file.
+        Parses the input PDF file using the selected backend and saves it as a Markdown file.
+        The "llamaparse" backend calls LlamaParse; the "pymupdf" backend rebuilds the
+        heading structure locally from the font sizes and flags of the PDF text spans.
         """
-        parser = LlamaParse(
-            result_type="markdown",
-            premium_mode=True,
-        )
         try:
-            # Load data from the PDF (returns a list of Document objects)
-            documents = parser.load_data(self.pdf_path)
-            if not documents:
-                raise ValueError("No data was parsed from the provided PDF.")
-
-            # Extract text from each document object and join them into a single string
-            markdown_content = "\n\n".join([doc.text for doc in documents])  # Assuming each 'doc' has a 'text' attribute
+            if self.backend == "pymupdf":
+                # Text lines are collected in the same page pass that extracts the images
+                images_with_caption = self._extract_images_with_captions()
+                markdown_content = self._build_markdown_from_text_lines(self.page_text_lines)
+                if not markdown_content.strip():
+                    raise ValueError("No text was found in the provided PDF.")
+            else:
+                parser = LlamaParse(
+                    result_type="markdown",
+                    premium_mode=True,
+                )
+                # Load data from the PDF (returns a list of Document objects)
+                documents = parser.load_data(self.pdf_path)
+                if not documents:
+                    raise ValueError("No data was parsed from the provided PDF.")
+
+                # Extract text from each document object and join them into a single string
+                markdown_content = "\n\n".join([doc.text for doc in documents])  # Assuming each 'doc' has a 'text' attribute
+                images_with_caption = self._extract_images_with_captions()
             
             # Save Markdown content to a file
             os.makedirs(os.path.dirname(self.output_md_path), exist_ok=True)
             with open(self.output_md_path, "w", encoding="utf-8") as md_file:
                 md_file.write(markdown_content)
 
-            images_with_caption = self._extract_images_with_captions()
-
             # Append images to Markdown file
             with open(self.output_md_path, "a", encoding="utf-8") as md_file:
                 for img in images_with_caption:
@@ -76,10 +146,16 @@ class LlamaPDFParser:
         
 
     def parse_all_images(self, filename, page, pagenum, text_blocks):
-        """Extract images from a PDF page."""
+        """
+        Extract images from a PDF page. Each unique image (by xref and by content hash)
+        is written once per document; later pages that reuse it reference the same file.
+        """
         image_docs = []
         image_info_list = page.get_image_info(xrefs=True)
         page_rect = page.rect
+        block_index = text_blocks if isinstance(text_blocks, TextBlockIndex) else TextBlockIndex(text_blocks)
+        if not hasattr(self, "_written_images"):
+            self._reset_written_images()
 
         for image_info in image_info_list:
             xref = image_info['xref']
@@ -90,14 +166,22 @@ class LlamaPDFParser:
             if img_bbox.width < page_rect.width / 20 or img_bbox.height < page_rect.height / 20:
                 continue
 
-            extracted_image = page.parent.extract_image(xref)
-            image_data = extracted_image["image"]
-            imgrefpath = os.path.join(os.getcwd(), f"{filename}")
-            os.makedirs(imgrefpath, exist_ok=True)
-            image_path = os.path.join(imgrefpath, f"image{xref}-page{pagenum}.png")
-            with open(image_path, "wb") as img_file:
-                img_file.write(image_data)
-            before_text, after_text = self.extract_text_around_item(text_blocks, img_bbox, page.rect.height)
+            image_path = self._written_images["by_xref"].get(xref)
+            if image_path is None:
+                extracted_image = page.parent.extract_image(xref)
+                image_data = extracted_image["image"]
+                content_hash = hashlib.sha1(image_data).hexdigest()
+                image_path = self._written_images["by_hash"].get(content_hash)
+                if image_path is None:
+                    imgrefpath = os.path.join(os.getcwd(), f"{filename}")
+                    os.makedirs(imgrefpath, exist_ok=True)
+                    image_path = os.path.join(imgrefpath, f"image{xref}-page{pagenum}.png")
+                    with open(image_path, "wb") as img_file:
+                        img_file.write(image_data)
+                    self._written_images["by_hash"][content_hash] = image_path
+                    self._written_images["files"].append((image_path, content_hash))
+                self._written_images["by_xref"][xref] = image_path
+            before_text, after_text = self.extract_text_around_item(block_index, img_bbox, page.rect.height)
             if before_text == "" and after_text == "":
                 continue
 
@@ -126,34 +210,202 @@ class LlamaPDFParser:
         """
         Extracts images from the PDF with captions and saves them to a folder.
         Returns a list of image documents with metadata.
+        Large documents are split into page ranges that are processed by worker
+        processes when extraction_workers > 1; results are merged in page order.
         """
         os.makedirs(self.image_output_path, exist_ok=True)
-        doc = fitz.open(self.pdf_path)
-        image_docs = []
+        with fitz.open(self.pdf_path) as doc:
+            page_count = doc.page_count
+
+        if self.extraction_workers <= 1 or page_count < self.parallel_min_pages:
+            image_docs, self.page_text_lines, _ = self._extract_page_range(0, page_count)
+            return image_docs
 
-        for page_num, page in enumerate(doc):
-            text_blocks = page.get_text("blocks")
-            image_docs.extend(self.parse_all_images(self.image_output_path, page, page_num + 1, text_blocks))
+        # Several ranges per worker so that figure-dense stretches of pages balance out
+        pages_per_task = max(1, math.ceil(page_count / (self.extraction_workers * 4)))
+        ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
 
+        image_docs = []
+        self.page_text_lines = []
+        canonical_paths = {}
+        path_by_hash = {}
+        # Spawned workers do not inherit the parent's threads or open handles
+        with ProcessPoolExecutor(max_workers=self.extraction_workers,
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            results = executor.map(_extract_page_range_worker,
+                                   [self.pdf_path] * len(ranges), [self.image_output_path] * len(ranges),
+                                   [self.backend] * len(ranges), *zip(*ranges))
+            for range_image_docs, range_text_lines, range_files in results:
+                # Images reused across ranges were written once per range; keep the first copy
+                for image_path, content_hash in range_files:
+                    if content_hash in path_by_hash:
+                        canonical_paths[image_path] = path_by_hash[content_hash]
+                        os.remove(image_path)
+                    else:
+                        path_by_hash[content_hash] = image_path
+                image_docs.extend(range_image_docs)
+                self.page_text_lines.extend(range_text_lines)
+
+        for image_doc in image_docs:
+            metadata = image_doc["metadata"]
+            metadata["image"] = canonical_paths.get(metadata["image"], metadata["image"])
         return image_docs
+
+    def _extract_page_range(self, start, stop):
+        """
+        Extracts images with captions (and, for the PyMuPDF backend, text lines) from the
+        pages in [start, stop). Returns (image_docs, page_text_lines, written_files), where
+        written_files lists the (path, content hash) of every image file written, in page order.
+        """
+        image_docs = []
+        page_text_lines = []
+        self._reset_written_images()
+        with fitz.open(self.pdf_path) as doc:
+            for page_num in range(start, stop):
+                page = doc[page_num]
+                # Text is extracted once per page; the caption blocks and the text lines share it.
+                textpage = page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)
+                text_blocks = page.get_text("blocks", textpage=textpage)
+                image_docs.extend(self.parse_all_images(self.image_output_path, page, page_num + 1, text_blocks))
+                if self.backend == "pymupdf":
+                    page_text_lines.append(self._collect_text_lines(page, textpage))
+
+        return image_docs, page_text_lines, self._written_images["files"]
+
+    def _reset_written_images(self):
+        """Forget which image files were written, so image dedup starts afresh."""
+        self._written_images = {"by_xref": {}, "by_hash": {}, "files": []}
+
+    @classmethod
+    def _for_page_extraction(cls, pdf_path, image_output_folder, backend):
+        """Creates a parser that only supports page extraction, skipping parsing and model loading."""
+        parser = cls.__new__(cls)
+        parser.pdf_path = pdf_path
+        parser.image_output_path = image_output_folder
+        parser.backend = backend
+        return parser
+
+    @staticmethod
+    def _collect_text_lines(page, textpage=None):
+        """
+        Returns the horizontal text lines of a page as dicts with the block number,
+        dominant font size, bold flag and text. Used by the PyMuPDF markdown backend.
+        textpage reuses text already extracted from the page.
+        """
+        lines = []
+        page_dict = page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT, textpage=textpage)
+        for block in page_dict["blocks"]:
+            for line in block.get("lines", []):
+                # Skip rotated text such as arXiv side stamps
+                if abs(line["dir"][1]) > 0.01:
+                    continue
+                spans = [span for span in line["spans"] if span["text"].strip()]
+                if not spans:
+                    continue
+                text = "".join(span["text"] for span in line["spans"]).strip()
+                dominant = max(spans, key=lambda span: len(span["text"]))
+                lines.append({
+                    "block": block["number"],
+                    "size": round(dominant["size"] * 2) / 2,
+                    "bold": all(span["flags"] & fitz.TEXT_FONT_BOLD for span in spans),
+                    "text": text,
+                })
+        return lines
+
+    def _build_markdown_from_text_lines(self, page_text_lines, max_heading_chars=120):
+        """
+        Builds heading-structured Markdown from per-page text lines. The most common font
+        size is taken as body text; larger sizes become headings ranked by size, and
+        all-bold lines at body size become the lowest heading level. The first heading of
+        the largest size is emitted as the "# " main title.
+        """
+        size_counts = Counter()
+        for lines in page_text_lines:
+            for line in lines:
+                size_counts[line["size"]] += len(line["text"])
+        if not size_counts:
+            return ""
+        body_size = size_counts.most_common(1)[0][0]
+
+        def heading_rank(line):
+            if line["size"] > body_size:
+                return line["size"]
+            if line["bold"] and line["size"] == body_size:
+                return body_size
+            return None
+
+        # Group consecutive lines of a block that share the same style into elements
+        elements = []
+        for lines in page_text_lines:
+            for line in lines:
+                rank = heading_rank(line)
+                previous = elements[-1] if elements else None
+                if previous and previous["block"] == line["block"] and previous["rank"] == rank:
+                    previous["lines"].append(line["text"])
+                else:
+                    elements.append({"block": line["block"], "rank": rank, "lines": [line["text"]]})
+
+        def join_lines(lines):
+            text = ""
+            for line in lines:
+                if text.endswith("-"):
+                    text = text[:-1] + line
+                else:
+                    text = f"{text} {line}" if text else line
+            return text
+
+        for element in elements:
+            element["text"] = join_lines(element["lines"])
+            if element["rank"] is not None and len(element["text"]) > max_heading_chars:
+                element["rank"] = None
+
+        heading_sizes = sorted({e["rank"] for e in elements if e["rank"] is not None}, reverse=True)
+        title_size = heading_sizes[0] if heading_sizes and heading_sizes[0] > body_size else None
+        section_sizes = [size for size in heading_sizes if size != title_size]
+        levels = {size: min(2 + i, 4) for i, size in enumerate(section_sizes)}
+
+        markdown_lines = []
+        title_written = False
+        for element in elements:
+            rank = element["rank"]
+            if rank is None:
+                markdown_lines.append(element["text"])
+            elif rank == title_size:
+                if not title_written:
+                    markdown_lines.append(f"# {element['text']}")
+                    title_written = True
+                else:
+                    markdown_lines.append(f"## {element['text']}")
+            else:
+                markdown_lines.append(f"{'#' * levels[rank]} {element['text']}")
+        return "\n\n".join(markdown_lines) + "\n"
     
     
     
     def extract_text_around_item(self, text_blocks, bbox, page_height, threshold_percentage=0.1):
-        """Extract text above and below a given bounding box on a page."""
+        """
+        Extract text above and below a given bounding box on a page.
+        text_blocks may be a TextBlockIndex built once per page, so that only blocks
+        within the vertical threshold of the image are examined.
+        """
         before_text, after_text = "", ""
         vertical_threshold_distance = page_height * threshold_percentage
         horizontal_threshold_distance = bbox.width * threshold_percentage
 
-        for block in text_blocks:
-            block_bbox = fitz.Rect(block[:4])
-            vertical_distance = min(abs(block_bbox.y1 - bbox.y0), abs(block_bbox.y0 - bbox.y1))
-            horizontal_overlap = max(0, min(block_bbox.x1, bbox.x1) - max(block_bbox.x0, bbox.x0))
+        if isinstance(text_blocks, TextBlockIndex):
+            candidates = text_blocks.near(bbox, vertical_threshold_distance)
+        else:
+            candidates = text_blocks
+
+        for block in candidates:
+            x0, y0, x1, y1 = block[:4]
+            vertical_distance = min(abs(y1 - bbox.y0), abs(y0 - bbox.y1))
+            horizontal_overlap = max(0, min(x1, bbox.x1) - max(x0, bbox.x0))
 
             if vertical_distance <= vertical_threshold_distance and horizontal_overlap >= -horizontal_threshold_distance:
-                if block_bbox.y1 < bbox.y0 and not before_text:
+                if y1 < bbox.y0 and not before_text:
                     before_text = block[4]
-                elif block_bbox.y0 > bbox.y1 and not after_text:
+                elif y0 > bbox.y1 and not after_text:
                     after_text = block[4]
                     break
 
@@ -163,63 +415,74 @@ class LlamaPDFParser:
 
     def _parse_markdown_to_json(self, md_content):
         """Parse Markdown file into a hierarchical JSON format."""
+        return self._parse_markdown(md_content)[0]
+
+    def _parse_markdown(self, md_content):
+        """
+        Single pass over the Markdown that keeps a stack of open headings. Returns the
+        heading hierarchy (as _parse_markdown_to_json) together with the same tree already
+        formatted as the node JSON list (as _format_hierarchy_to_json). Content lines are
+        buffered in lists and joined once at the end.
+        """
         main_title = ""
         hierarchy = {}
-        current_levels = []
+        formatted = []
+        stack = []  # (heading, hierarchy node, formatted node) for each open heading
+        buffers = []  # (hierarchy node, formatted node) in creation order
+        formatted_nodes = {}  # id(hierarchy node) -> formatted node
+        heading_pattern = re.compile(r"^(#+) (.+)")
 
         for line in md_content.splitlines():
             # Match for main title (only the first # heading)
-            if re.match(r"^# ", line):
+            if line.startswith("# "):
                 if not main_title:  # Capture the first main title
                     main_title = self._clean_heading(line)
                 continue
 
             # Match for section and subheadings
-            heading_match = re.match(r"^(#+) (.+)", line)
+            heading_match = heading_pattern.match(line)
             if heading_match:
                 level = len(heading_match.group(1))  # Determine heading level
                 heading_text = heading_match.group(2)
 
-                # Adjust the current level hierarchy
-                while len(current_levels) >= level:
-                    current_levels.pop()
-                current_levels.append(heading_text)
-
-                # Build metadata for the current section
-                metadata = {
-                    "main title": main_title,
-                    "section title": current_levels[0] if len(current_levels) > 0 else "",
-                    "sub heading": current_levels[1] if len(current_levels) > 1 else "",
-                }
+                # Close headings at this level or deeper
+                del stack[level - 1:]
+
+                siblings = stack[-1][1]["subheadings"] if stack else hierarchy
+                node = siblings.get(heading_text)
+                if node is None:
+                    metadata = {
+                        "main title": main_title,
+                        "section title": stack[0][0] if stack else heading_text,
+                        "sub heading": (stack[1][0] if len(stack) > 1 else heading_text) if stack else "",
+                    }
+                    node = {"content": [], "metadata": metadata, "subheadings": {}}
+                    siblings[heading_text] = node
+                    json_node = {
+                        "content": "",
+                        "metadata": metadata,
+                        "embeddings-Main-Headding": "",
+                        "embeddings-Section-Headding": "",
+                        "embeddings-Sub-Headding": "",
+                        "subheadings": [],
+                    }
+                    (stack[-1][2]["subheadings"] if stack else formatted).append(json_node)
+                    buffers.append((node, json_node))
+                    formatted_nodes[id(node)] = json_node
+                else:
+                    # A repeated heading reopens the existing node, as a dict lookup by name would
+                    json_node = formatted_nodes[id(node)]
+                stack.append((heading_text, node, json_node))
+
+            elif stack:
+                # Add content to the most recent heading
+                stack[-1][1]["content"].append(line.strip() + "\n")
 
-                # Navigate to the appropriate level in the hierarchy
-                current_level = hierarchy
-                for lvl in current_levels[:-1]:
-                    current_level = current_level.setdefault(lvl, {"content": "", "subheadings": {}})["subheadings"]
+        for node, json_node in buffers:
+            node["content"] = "".join(node["content"])
+            json_node["content"] = node["content"].strip()
 
-                # Create a new entry for the current heading
-                if current_levels[-1] not in current_level:
-                    current_level[current_levels[-1]] = {"content": "", "metadata": metadata, "subheadings": {}}
-
-            else:
-                # Add content to the most recent heading
-                if current_levels:
-                    current_level = hierarchy
-                    for lvl in current_levels[:-1]:
-                        current_level = current_level[lvl]["subheadings"]
-                    if current_levels[-1] not in current_level:
-                        current_level[current_levels[-1]] = {
-                            "content": "",
-                            "metadata": {
-                                "main title": main_title,
-                                "section title": current_levels[0] if len(current_levels) > 0 else "",
-                                "sub heading": current_levels[1] if len(current_levels) > 1 else ""
-                            },
-                            "subheadings": {}
-                        }
-                    current_level[current_levels[-1]]["content"] += line.strip() + "\n"
-
-        return hierarchy
+        return hierarchy, formatted
 
     def _format_hierarchy_to_json(self, hierarchy):
         """Recursive function to format the hierarchy into the desired JSON structure."""
@@ -238,9 +501,7 @@ class LlamaPDFParser:
 
     def convert_md_to_json(self):
         """Convert Markdown file to JSON and save it to a file."""
-        md_content = self.documents
-        hierarchy = self._parse_markdown_to_json(md_content)
-        formatted_json = self._format_hierarchy_to_json(hierarchy)
+        formatted_json = list(self._parsed_markdown()[1])
 
         # Add images to JSON
         for img in self.images_with_caption:
@@ -262,7 +523,13 @@ class LlamaPDFParser:
 
     def split_heading_wise(self):
         """Splits the parsed Markdown document into a hierarchical structure."""
-        return self._parse_markdown_to_json(self.documents)
+        return self._parsed_markdown()[0]
+
+    def _parsed_markdown(self):
+        """Parses self.documents once and returns the cached (hierarchy, node list) pair."""
+        if getattr(self, "_markdown_tree", None) is None:
+            self._markdown_tree = self._parse_markdown(self.documents)
+        return self._markdown_tree
 
     def save_cleaned_data(self, output_path):
         """
@@ -311,21 +578,24 @@ class LlamaPDFParser:
         add_nodes(docs, {"main title": main_title, "section title": ""})
         return nodes
 
-    def generate_embeddings(self):
+    def generate_embeddings(self, batch_size=DEFAULT_BATCH_SIZE):
         """Generate embeddings for headings and store them in nodes."""
         embed_model = self.embedding_model
         nodes = self.get_text_page_nodes()
 
+        # Both headings of every node are encoded in one batched, length-sorted pass
+        texts = []
         for node in nodes:
-            main_heading_text = node['metadata'].get('main title', '')
-            section_heading_text = node['metadata'].get('section title', '')
+            texts.append(node['metadata'].get('main title', ''))
+            texts.append(node['metadata'].get('section title', ''))
+        # vectors = [embed_model.get_query_embedding(text) for text in texts] #For nv-embed
+        vectors = encode_batched(embed_model, texts, batch_size=batch_size, cache=self.embedding_cache)
 
-            if main_heading_text:
-                # node['embeddings-Main-Headding'] = embed_model.get_query_embedding(main_heading_text) #For nv-embed
-                node['embeddings-Main-Headding'] = embed_model.encode(main_heading_text)
-            if section_heading_text:
-                # node['embeddings-Section-Headding'] = embed_model.get_query_embedding(section_heading_text) #For nv-embed
-                node['embeddings-Section-Headding'] = embed_model.encode(section_heading_text)
+        for i, node in enumerate(nodes):
+            if texts[2 * i]:
+                node['embeddings-Main-Headding'] = vectors[2 * i]
+            if texts[2 * i + 1]:
+                node['embeddings-Section-Headding'] = vectors[2 * i + 1]
 
         print("Embeddings generated and stored in nodes.")
         return nodes
@@ -337,4 +607,10 @@ class LlamaPDFParser:
             return obj.__dict__
         return str(obj)
     
-    
\ No newline at end of file
+    
+
+
+def _extract_page_range_worker(pdf_path, image_output_folder, backend, start, stop):
+    """Process-pool entry point: extracts one page range with its own fitz document."""
+    parser = LlamaPDFParser._for_page_extraction(pdf_path, image_output_folder, backend)
+    return parser._extract_page_range(start, stop)
@@ -1,16 +1,61 @@
+import hashlib
+import heapq
 import json
+import numpy as np
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
+from chunking import (DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP_TOKENS, SectionChunker, chunk_row_id, chunking_id,
+                      get_tokenizer)
 from dotenv import load_dotenv
+from embeddings import (DEFAULT_BATCH_SIZE, EMBEDDING_BACKENDS, EMBEDDING_DIM, EMBEDDING_MODEL_NAME,
+                        EmbeddingCache, EmbeddingModelRegistry, embedding_id, encode_batched, get_embedding_model)
 # from llama_index.embeddings.nvidia import NVIDIAEmbedding
-from pymilvus import connections, CollectionSchema, FieldSchema, DataType, Collection, list_collections
-from sentence_transformers import SentenceTransformer
+from milvus_connection import LoadedCollections, MilvusConfig, MilvusConnectionPool
+from pymilvus import CollectionSchema, FieldSchema, DataType
+from search_cache import SearchResultCache
+from vector_storage import DEFAULT_PCA_PATH, STORAGE_MODES, VectorStorage
+
+VECTOR_FIELDS = ("main_title_embedding", "section_title_embedding", "sub_heading_embedding", "content_embedding")
+
+# per_document: one collection per ingested JSON file (the original layout).
+# corpus: a single collection for every document, partitioned by a doc_id partition key.
+LAYOUTS = ("per_document", "corpus")
+
+NODE_TYPES = ("text", "image")
+
+# Hits fetched per document when collapsing chunks client-side, as a multiple of the limit.
+CHUNK_OVERFETCH = 3
+
+# Relative weight of each vector field in hybrid search. With the weighted ranker the scores
+# are combined with these weights; with RRF, fields weighted 0 are left out of the request.
+DEFAULT_HYBRID_WEIGHTS = {
+    "main_title_embedding": 0.2,
+    "section_title_embedding": 0.3,
+    "sub_heading_embedding": 1.0,
+    "content_embedding": 1.0,
+}
+
 
 class MilvusEmbeddingManager:
-    def __init__(self, host="host.docker.internal", port="19530"):
-        self.host = host
-        self.port = port
+    DEFAULT_QUERIES = ("Introduction", "Abstract", "Conclusion", "References", "Methodology", "Results")
+    _default_query_vectors = {}
+
+    def __init__(self, host=None, port=None, embedding_batch_size=DEFAULT_BATCH_SIZE,
+                 embedding_cache_path=".embedding_cache/embeddings.sqlite", embedding_backend=None,
+                 storage_mode=None, pca_path=DEFAULT_PCA_PATH, connect=True, insert_batch_size=256,
+                 overlap_inserts=True, layout=None, corpus_collection="docfusion_corpus",
+                 corpus_max_documents=100, search_concurrency=8, hybrid_ranker="rrf", hybrid_weights=None,
+                 rrf_k=60, uri=None, store=None, local_store_path=None, index_params=None, search_params=None,
+                 search_cache_path=".search_cache/results.sqlite", search_cache_radius=None,
+                 chunk_max_tokens=None, chunk_overlap_tokens=None):
+        self.config = MilvusConfig(host, port, uri=uri, store=store, local_store_path=local_store_path)
+        self.host = self.config.host
+        self.port = self.config.port
+        self.embedding_batch_size = embedding_batch_size
+        self.insert_batch_size = insert_batch_size
+        self.overlap_inserts = overlap_inserts
 
         load_dotenv()
 
@@ -24,40 +69,392 @@ class MilvusEmbeddingManager:
         #     truncate="END",
         #     api_key=self.nim_api_key
         # )
-        self.embedder = SentenceTransformer('embaas/sentence-transformers-e5-large-v2')
+        # Queries must be embedded by the same backend that embedded the corpus, so the
+        # backend can also be set once for every process through EMBEDDING_BACKEND in .env.
+        self.model_name = EMBEDDING_MODEL_NAME
+        self.embedding_backend = embedding_backend or os.getenv("EMBEDDING_BACKEND", "torch")
+        if self.embedding_backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend '{self.embedding_backend}'. Choose one of {EMBEDDING_BACKENDS}.")
+        self.embedding_id = embedding_id(self.model_name, self.embedding_backend)
+        self.embedding_cache = None
+        if embedding_cache_path:
+            self.embedding_cache = EmbeddingCache(embedding_cache_path, model_name=self.embedding_id)
+
+        # New collections are created in this storage mode; existing collections keep the
+        # mode recorded in their description, so queries always match how they were stored.
+        self.storage_mode = storage_mode or os.getenv("VECTOR_STORAGE_MODE", "float32")
+        if self.storage_mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode '{self.storage_mode}'. Choose one of {STORAGE_MODES}.")
+        self.pca_path = pca_path
+        # Index and search parameters default to the storage mode's; MILVUS_INDEX_PARAMS and
+        # MILVUS_SEARCH_PARAMS (JSON) override them, e.g. with a configuration from bench_index.
+        if index_params is None:
+            index_params = json.loads(os.getenv("MILVUS_INDEX_PARAMS") or "null")
+        if search_params is None:
+            search_params = json.loads(os.getenv("MILVUS_SEARCH_PARAMS") or "null")
+        self.index_params = index_params
+        self.search_params = search_params
+        self._storages = {}
 
-        connections.connect("default", host=host, port=port)
-        print("Connected to Milvus.")
+        self.layout = layout or os.getenv("MILVUS_LAYOUT", "per_document")
+        if self.layout not in LAYOUTS:
+            raise ValueError(f"Unknown layout '{self.layout}'. Choose one of {LAYOUTS}.")
+        self.corpus_collection = corpus_collection
+        self.corpus_max_documents = corpus_max_documents
+        self.search_concurrency = search_concurrency
+        if hybrid_ranker not in ("rrf", "weighted"):
+            raise ValueError(f"Unknown hybrid ranker '{hybrid_ranker}'. Choose 'rrf' or 'weighted'.")
+        self.hybrid_ranker = hybrid_ranker
+        self.hybrid_weights = dict(DEFAULT_HYBRID_WEIGHTS, **(hybrid_weights or {}))
+        self.rrf_k = rrf_k
+
+        # Connections are shared through the pool; collections used for search are loaded
+        # once and kept warm, releasing the coldest ones past the memory budget.
+        self.store = self.config.api()
+        self.alias = MilvusConnectionPool.connect(self.config) if connect else "default"
+        self.loaded = LoadedCollections(self.config.loaded_bytes_budget, self._estimate_loaded_bytes)
+
+        # Section content is split into overlapping chunks that fit the embedding model's input
+        # (CHUNK_MAX_TOKENS and CHUNK_OVERLAP_TOKENS; a size of 0 embeds whole sections).
+        if chunk_max_tokens is None:
+            chunk_max_tokens = int(os.getenv("CHUNK_MAX_TOKENS", DEFAULT_MAX_TOKENS))
+        if chunk_overlap_tokens is None:
+            chunk_overlap_tokens = int(os.getenv("CHUNK_OVERLAP_TOKENS", DEFAULT_OVERLAP_TOKENS))
+        self.chunk_max_tokens = chunk_max_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self._chunker = None
+
+        # Search results are cached per store, layout and embedding model. Ingestion in any process
+        # sharing the cache file bumps its corpus version, which invalidates every cached result.
+        self.search_cache = None
+        if search_cache_path:
+            if search_cache_radius is None:
+                search_cache_radius = float(os.getenv("SEARCH_CACHE_RADIUS", "0.05"))
+            scope = json.dumps([self.config.key(), self.layout, self.corpus_collection, self.embedding_id])
+            self.search_cache = SearchResultCache(search_cache_path, scope=scope, radius=search_cache_radius)
+
+    @property
+    def embedder(self):
+        """The process-wide shared embedding model, loaded on first use."""
+        return get_embedding_model(self.model_name, self.embedding_backend)
+
+    def storage(self, mode=None):
+        """The VectorStorage for a mode (the configured one by default), created once."""
+        mode = mode or self.storage_mode
+        if mode not in self._storages:
+            self._storages[mode] = VectorStorage(mode, self.pca_path, self.index_params, self.search_params)
+        return self._storages[mode]
+
+    def storage_for_collection(self, collection):
+        """The VectorStorage a collection was created with."""
+        storage = self.storage(VectorStorage.mode_from_description(collection.description))
+        if storage.mode == "pca":
+            field = next(f for f in collection.schema.fields if f.name == "content_embedding")
+            if field.params.get("dim") != storage.dim:
+                raise ValueError(f"Collection '{collection.name}' stores {field.params.get('dim')}-dim PCA vectors "
+                                 f"but the projection at '{self.pca_path}' has {storage.dim} dimensions.")
+        return storage
 
     def create_or_load_collection(self, collection_name):
-        if collection_name in list_collections():
+        if collection_name in self.store.list_collections(using=self.alias):
             print(f"Collection '{collection_name}' already exists. Loading collection.")
-            return Collection(name=collection_name)
+            return self.store.Collection(name=collection_name, using=self.alias)
         else:
+            storage = self.storage()
+            vector_type = DataType.FLOAT16_VECTOR if storage.mode == "float16" else DataType.FLOAT_VECTOR
             schema = CollectionSchema([
                 FieldSchema(name="id", dtype=DataType.INT64, is_primary=True),
-                FieldSchema(name="main_title_embedding", dtype=DataType.FLOAT_VECTOR, dim=1024),
-                FieldSchema(name="section_title_embedding", dtype=DataType.FLOAT_VECTOR, dim=1024),
-                FieldSchema(name="sub_heading_embedding", dtype=DataType.FLOAT_VECTOR, dim=1024),
-                FieldSchema(name="content_embedding", dtype=DataType.FLOAT_VECTOR, dim=1024),
+                FieldSchema(name="doc_id", dtype=DataType.VARCHAR, max_length=255),
+                FieldSchema(name="node_type", dtype=DataType.VARCHAR, max_length=16),
+                FieldSchema(name="page_num", dtype=DataType.INT64),
+                FieldSchema(name="main_title_embedding", dtype=vector_type, dim=storage.dim),
+                FieldSchema(name="section_title_embedding", dtype=vector_type, dim=storage.dim),
+                FieldSchema(name="sub_heading_embedding", dtype=vector_type, dim=storage.dim),
+                FieldSchema(name="content_embedding", dtype=vector_type, dim=storage.dim),
                 FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535),
                 FieldSchema(name="sub_heading", dtype=DataType.VARCHAR, max_length=255),
-                FieldSchema(name="image_path", dtype=DataType.VARCHAR, max_length=1024)
-            ], description=f"Embeddings collection for {collection_name}")
+                FieldSchema(name="image_path", dtype=DataType.VARCHAR, max_length=1024),
+                FieldSchema(name="content_hash", dtype=DataType.VARCHAR, max_length=64),
+                FieldSchema(name="parent_id", dtype=DataType.INT64),
+                FieldSchema(name="chunk_index", dtype=DataType.INT64)
+            ], description=f"Embeddings collection for {collection_name}{storage.description_tag}")
 
             print(f"Creating collection '{collection_name}'.")
-            return Collection(name=collection_name, schema=schema)
+            return self.store.Collection(name=collection_name, schema=schema, using=self.alias)
+
+    def create_or_load_corpus_collection(self):
+        """The single collection of the corpus layout, keyed by a doc_id partition key."""
+        if self.corpus_collection in self.store.list_collections(using=self.alias):
+            return self.store.Collection(name=self.corpus_collection, using=self.alias)
+
+        storage = self.storage()
+        vector_type = DataType.FLOAT16_VECTOR if storage.mode == "float16" else DataType.FLOAT_VECTOR
+        schema = CollectionSchema([
+            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True),
+            FieldSchema(name="doc_id", dtype=DataType.VARCHAR, max_length=255, is_partition_key=True),
+            FieldSchema(name="node_type", dtype=DataType.VARCHAR, max_length=16),
+            FieldSchema(name="page_num", dtype=DataType.INT64),
+            FieldSchema(name="node_index", dtype=DataType.INT64),
+            FieldSchema(name="main_title_embedding", dtype=vector_type, dim=storage.dim),
+            FieldSchema(name="section_title_embedding", dtype=vector_type, dim=storage.dim),
+            FieldSchema(name="sub_heading_embedding", dtype=vector_type, dim=storage.dim),
+            FieldSchema(name="content_embedding", dtype=vector_type, dim=storage.dim),
+            FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535),
+            FieldSchema(name="main_title", dtype=DataType.VARCHAR, max_length=1024),
+            FieldSchema(name="section_title", dtype=DataType.VARCHAR, max_length=1024),
+            FieldSchema(name="sub_heading", dtype=DataType.VARCHAR, max_length=255),
+            FieldSchema(name="image_path", dtype=DataType.VARCHAR, max_length=1024),
+            FieldSchema(name="content_hash", dtype=DataType.VARCHAR, max_length=64),
+            FieldSchema(name="parent_id", dtype=DataType.INT64),
+            FieldSchema(name="chunk_index", dtype=DataType.INT64)
+        ], description=f"Corpus embeddings collection{storage.description_tag}")
+
+        print(f"Creating corpus collection '{self.corpus_collection}'.")
+        return self.store.Collection(name=self.corpus_collection, schema=schema, num_partitions=64,
+                                     using=self.alias)
+
+    def document_collections(self):
+        """Names of the per-document collections, leaving out the corpus collection."""
+        return [name for name in self.store.list_collections(using=self.alias) if name != self.corpus_collection]
+
+    def _open_collection(self, collection_name):
+        if collection_name == self.corpus_collection:
+            return self.create_or_load_corpus_collection()
+        return self.store.Collection(name=collection_name, using=self.alias)
+
+    def loaded_collection(self, collection_name):
+        """A collection ready for search, loaded at most once per process while it stays warm."""
+        return self.loaded.get(collection_name, self._open_collection)
+
+    def collection_in_use(self, collection_name):
+        """
+        Like loaded_collection, as a context manager: the collection is not released to make
+        room for other collections while the with block runs, e.g. during a search.
+        """
+        return self.loaded.use(collection_name, self._open_collection)
+
+    def _estimate_loaded_bytes(self, collection):
+        """Rough query node memory of a loaded collection: its vectors plus a per-row allowance."""
+        storage = self.storage_for_collection(collection)
+        return collection.num_entities * (len(VECTOR_FIELDS) * storage.vector_bytes() + 2048)
+
+    @staticmethod
+    def corpus_row_id(doc_id, node_index):
+        """Deterministic 63-bit primary key of a node in the corpus collection."""
+        digest = hashlib.blake2b(f"{doc_id}\0{node_index}".encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") & (2 ** 63 - 1)
+
+    @staticmethod
+    def section_row_id(doc_id, heading_path, occurrence):
+        """
+        Deterministic 63-bit primary key of a section: the document, its heading path and the
+        position of the node among the nodes sharing that path (paragraphs or figures of one
+        section), so a section keeps its id when the document is re-ingested.
+        """
+        key = "\0".join([doc_id, *heading_path, str(occurrence)])
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") & (2 ** 63 - 1)
+
+    def content_hash(self, row):
+        """Hash of everything a row's vectors and text are made from, including the embedding model."""
+        parts = [self.embedding_id, row["main_title"], row["section_title"], row["sub_heading"], row["content"],
+                 row["image_path"], str(row.get("page_num", 0))]
+        return hashlib.blake2b("\0".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+    def assign_section_ids(self, rows, doc_id):
+        """Key flattened rows by section_row_id and add their content hash, document id and node index."""
+        occurrences = {}
+        keyed = []
+        for row in rows:
+            heading_path = (row["main_title"], row["section_title"], row["sub_heading"])
+            occurrence = occurrences.get(heading_path, 0)
+            occurrences[heading_path] = occurrence + 1
+            keyed.append(dict(row, id=self.section_row_id(doc_id, heading_path, occurrence), node_index=row["id"],
+                              doc_id=doc_id, content_hash=self.content_hash(row)))
+        return keyed
+
+    @property
+    def chunker(self):
+        """The SectionChunker, created with the model's tokenizer on first use; None when chunking is off."""
+        if self._chunker is None and self.chunk_max_tokens > 0:
+            self._chunker = SectionChunker(get_tokenizer(self.model_name), self.chunk_max_tokens,
+                                           self.chunk_overlap_tokens)
+        return self._chunker
+
+    @property
+    def chunk_embedding_id(self):
+        """Identity of the vectors of chunk rows: the embedding model plus the chunking configuration."""
+        tokenizer = self.chunker.tokenizer if self.chunker else None
+        return f"{self.embedding_id}#{chunking_id(tokenizer, self.chunk_max_tokens, self.chunk_overlap_tokens)}"
+
+    def chunk_rows(self, rows):
+        """
+        Split the content of keyed rows into token-bounded chunks. Every chunk keeps the titles,
+        image path and node index of its section and links to it through parent_id.
+        """
+        chunked = []
+        for row in rows:
+            pieces = self.chunker.split(row["content"]) if self.chunker and row["content"] else [row["content"]]
+            for chunk_index, piece in enumerate(pieces):
+                chunk = dict(row, id=chunk_row_id(row["id"], chunk_index), parent_id=row["id"],
+                             chunk_index=chunk_index, content=piece)
+                chunk["content_hash"] = self.content_hash(chunk)
+                chunked.append(chunk)
+        return chunked
+
+    def _load_stored_rows(self, collection):
+        """
+        Load a collection so its rows can be queried or deleted by expression; False when it
+        has no rows. Only indexed collections can be loaded, so a collection left unindexed by
+        an ingestion that stopped before create_indexes is indexed first.
+        """
+        indexed = {index.field_name for index in collection.indexes}
+        if any(field not in indexed for field in VECTOR_FIELDS):
+            collection.flush()
+            if not collection.num_entities:
+                return False
+            self._create_missing_indexes(collection)
+        collection.load()
+        return True
+
+    def _delete_rows(self, collection, expr):
+        """Delete the rows matching an expression."""
+        if self._load_stored_rows(collection):
+            collection.delete(expr)
+
+    def _delete_document(self, collection, doc_id):
+        """Delete every row of a document from the corpus collection."""
+        self._delete_rows(collection, f"doc_id == {json.dumps(doc_id, ensure_ascii=False)}")
+
+    def _stored_sections(self, collection, doc_id):
+        """
+        {id: (content_hash, node_index)} of a document's stored rows, or None for collections
+        created before content hashes were stored.
+        """
+        field_names = [field.name for field in collection.schema.fields]
+        if "content_hash" not in field_names:
+            return None
+        if not self._load_stored_rows(collection):
+            return {}
+        corpus = "node_index" in field_names
+        expr = f"doc_id == {json.dumps(doc_id, ensure_ascii=False)}" if corpus else "id >= 0"
+        output_fields = ["content_hash", "node_index"] if corpus else ["content_hash"]
+        stored = {}
+        for batch in self.scan(collection, output_fields, expr=expr):
+            for entity in batch:
+                stored[entity["id"]] = (entity["content_hash"], entity.get("node_index"))
+        return stored
+
+    @staticmethod
+    def doc_filter(doc_ids):
+        """Milvus boolean expression restricting a search to a set of documents."""
+        if not doc_ids:
+            return None
+        return f"doc_id in {json.dumps(list(doc_ids), ensure_ascii=False)}"
+
+    def node_filter(self, collection, doc_ids=None, node_type=None, page_range=None):
+        """
+        Milvus boolean expression restricting a search of a collection to some documents, to
+        "image" or "text" nodes and to an inclusive (first, last) page range; None for no filter.
+        """
+        clauses = []
+        if doc_ids:
+            clauses.append(self.doc_filter(doc_ids))
+        if node_type:
+            if node_type not in NODE_TYPES:
+                raise ValueError(f"Unknown node type '{node_type}'. Choose one of {NODE_TYPES}.")
+            if self._has_field(collection, "node_type"):
+                clauses.append(f'node_type == "{node_type}"')
+            else:
+                # Collections created before node_type tell nodes apart by their image path.
+                clauses.append(f'image_path {"!=" if node_type == "image" else "=="} "No image available"')
+        if page_range:
+            if self._has_field(collection, "page_num"):
+                clauses.append(f"page_num >= {int(page_range[0])} and page_num <= {int(page_range[1])}")
+            else:
+                clauses.append("id < 0")  # No page numbers stored, so no node qualifies.
+        return " and ".join(f"({clause})" for clause in clauses) or None
+
+    @staticmethod
+    def range_params(storage, threshold=None, max_similarity=None):
+        """
+        Search params of a range search: Milvus only returns hits scoring above threshold
+        (radius) and at most max_similarity (range_filter).
+        """
+        param = storage.search_params()
+        params = dict(param["params"])
+        if threshold is not None:
+            params["radius"] = threshold
+        if max_similarity is not None:
+            params["range_filter"] = max_similarity
+        return dict(param, params=params)
 
     def generate_embeddings(self, text_or_image_caption):
         """Generate embeddings for the given text."""
-        return self.embedder.encode(text_or_image_caption) if text_or_image_caption else [0.0] * 1024
+        if not text_or_image_caption:
+            return [0.0] * 1024
+        if self.embedding_cache is None:
+            return self.embedder.encode(text_or_image_caption)
+        return encode_batched(self.embedder, [text_or_image_caption], cache=self.embedding_cache)[0]
+
+    def generate_embeddings_batch(self, texts):
+        """Generate embeddings for many texts at once; empty texts map to zero vectors."""
+        return encode_batched(self.embedder, texts, batch_size=self.embedding_batch_size, cache=self.embedding_cache)
+
+    @staticmethod
+    def flatten_nodes(json_data):
+        """
+        Flatten the node JSON (depth first, as the nodes appear in the document) into rows
+        with the id, titles, content, image path, node type and page number that get stored for
+        each node. Only image nodes carry a page number; 0 means unknown.
+        """
+        rows = []
+
+        def visit(node):
+            metadata = node.get("metadata", {})
+            if "image" in metadata:
+                content = metadata["caption"]
+            else:
+                content = node.get("content", "")
+            rows.append({
+                "id": len(rows) + 1,
+                "main_title": metadata.get("main title", ""),
+                "section_title": metadata.get("section title", ""),
+                "sub_heading": metadata.get("sub heading", "").strip(),
+                "content": content,
+                "image_path": metadata.get("image", "No image available"),
+                "node_type": "image" if "image" in metadata else "text",
+                "page_num": int(metadata.get("page_num") or 0),
+            })
+            for sub_node in node.get("subheadings", []):
+                visit(sub_node)
+
+        for node in json_data:
+            visit(node)
+        return rows
+
+    def embed_rows(self, rows):
+        """Embed the four fields of every row in batched calls; returns an (n, 4, dim) array."""
+        texts = []
+        for row in rows:
+            texts.extend([row["main_title"], row["section_title"], row["sub_heading"], row["content"]])
+        vectors = self.generate_embeddings_batch(texts)
+        return vectors.reshape(len(rows), 4, vectors.shape[-1])
 
-    def process_and_insert_json(self, json_file):
-        """Process JSON data from a file and insert into Milvus, handling both text and image nodes."""
+    def process_and_insert_json(self, json_file, embeddings=None):
+        """
+        Process JSON data from a file and insert into Milvus, handling both text and image nodes.
+        Section content is split into token-bounded chunks, one row each. Re-ingesting a document
+        only embeds and upserts the chunks whose content hash changed, and deletes the chunks that
+        are gone. Precomputed embeddings (one row of four field vectors per chunk, in traversal
+        order) are used instead of running the embedder. Returns the embeddings of all chunks
+        when every chunk was embedded, otherwise None.
+        """
         collection_name = os.path.splitext(os.path.basename(json_file))[0]
-        collection = self.create_or_load_collection(collection_name)
-        global_id = 1
-        record_count = 0
+        if self.layout == "corpus":
+            collection = self.create_or_load_corpus_collection()
+        else:
+            collection = self.create_or_load_collection(collection_name)
 
         # Load and parse the JSON file
         with open(json_file, "r", encoding="utf-8") as file:
@@ -67,147 +464,430 @@ class MilvusEmbeddingManager:
                 print(f"Error parsing JSON file: {e}")
                 return
 
-        def process_node(node):
-            nonlocal global_id, record_count
-            node_id = global_id
-            global_id += 1
-
-            # Extract metadata and content
-            main_title = node.get("metadata", {}).get("main title", "")
-            section_title = node.get("metadata", {}).get("section title", "")
-            sub_heading = node.get("metadata", {}).get("sub heading", "").strip()
-            image_path = node.get("metadata", {}).get("image", "No image available")
-            
-            if "image" in node.get("metadata", {}):
-                content = node["metadata"]["caption"]
-                # print("Content: ", content)
+        rows = self.chunk_rows(self.assign_section_ids(self.flatten_nodes(json_data), collection_name))
+        if embeddings is not None and len(embeddings) != len(rows):
+            print(f"Cached embeddings do not match '{collection_name}'. Re-embedding.")
+            embeddings = None
+
+        stored = self._stored_sections(collection, collection_name)
+        if stored is None:
+            # No content hashes to compare against: replace every row of the document.
+            print(f"'{collection_name}' predates content hashes; re-inserting all of its rows.")
+            if self.layout == "corpus":
+                self._delete_document(collection, collection_name)
             else:
-                content = node.get("content", "")
+                self._delete_rows(collection, "id >= 0")
+            stored = {}
+        changed = [i for i, row in enumerate(rows) if stored.get(row["id"], (None, None))[0] != row["content_hash"]]
+        # Unchanged sections that only moved within the document keep their vectors.
+        moved = [row for row in rows if row["id"] in stored and stored[row["id"]][0] == row["content_hash"]
+                 and stored[row["id"]][1] not in (None, row["node_index"])]
+        new_ids = {row["id"] for row in rows}
+        removed = [row_id for row_id in stored if row_id not in new_ids]
+        upsert = bool(stored)
 
-            main_title_emb = self.generate_embeddings(main_title)
-            section_title_emb = self.generate_embeddings(section_title)
-            sub_heading_emb = self.generate_embeddings(sub_heading)
-            content_emb = self.generate_embeddings(content)
-
-
-            # Insert text embeddings into Milvus
-            collection.insert([
-                [node_id],
-                [main_title_emb],
-                [section_title_emb],
-                [sub_heading_emb],
-                [content_emb],
-                [content],
-                [sub_heading],
-                [image_path]
-            ])
-            record_count += 1
-
-            # Process subheadings recursively
-            for sub_node in node.get("subheadings", []):
-                process_node(sub_node)
+        storage = self.storage_for_collection(collection)
+        batches = [changed[start:start + self.insert_batch_size]
+                   for start in range(0, len(changed), self.insert_batch_size)]
 
-        for node in json_data:
-            process_node(node)
+        def embed(batch_index):
+            if embeddings is not None:
+                return np.asarray(embeddings[batches[batch_index]], dtype=np.float32)
+            return self.embed_rows([rows[i] for i in batches[batch_index]])
 
-        print(f"Data insertion complete for '{collection_name}'. Total records inserted: {record_count}.")
+        # Each batch is one columnar insert. With overlap_inserts, batch k is inserted by a
+        # background thread while batch k + 1 is being embedded.
+        inserted = []
+        pending = None
+        with ThreadPoolExecutor(max_workers=1) as insert_executor:
+            for batch_index, batch in enumerate(batches):
+                batch_embeddings = embed(batch_index)
+                inserted.append(batch_embeddings)
+                if pending is not None:
+                    pending.result()
+                pending = insert_executor.submit(self._insert_rows, collection, [rows[i] for i in batch],
+                                                 storage.transform(batch_embeddings), upsert)
+                if not self.overlap_inserts:
+                    pending.result()
+            if pending is not None:
+                pending.result()
 
+        for start in range(0, len(moved), self.insert_batch_size):
+            batch = moved[start:start + self.insert_batch_size]
+            entities = {entity["id"]: entity for entity in collection.query(
+                expr=f"id in {[row['id'] for row in batch]}", output_fields=list(VECTOR_FIELDS))}
+            vectors = np.array([[self._stored_vector(entities[row["id"]][field]) for field in VECTOR_FIELDS]
+                                for row in batch])
+            self._insert_rows(collection, batch, vectors, upsert=True)
+        if removed:
+            collection.delete(f"id in {removed}")
+        collection.flush()
+        if changed or moved or removed:
+            self._corpus_changed()
+
+        print(f"Data insertion complete for '{collection_name}'. {len(changed)} of {len(rows)} chunks embedded "
+              f"in {len(batches)} batches, {len(moved)} moved, {len(removed)} removed.")
+        if len(changed) != len(rows):
+            return None
+        if not inserted:
+            return np.zeros((0, 4, EMBEDDING_DIM), dtype=np.float32)
+        return np.concatenate(inserted)
+
+    @staticmethod
+    def _insert_rows(collection, rows, vectors, upsert=False):
+        """Insert (or upsert) rows and their (n, 4, dim) field vectors in a single columnar request."""
+        columns = []
+        for field in collection.schema.fields:
+            if field.name in VECTOR_FIELDS:
+                columns.append(list(vectors[:, VECTOR_FIELDS.index(field.name)]))
+            elif field.name == "text":
+                columns.append([row["content"] for row in rows])
+            else:
+                columns.append([row[field.name] for row in rows])
+        if upsert:
+            collection.upsert(columns)
+        else:
+            collection.insert(columns)
 
     def create_indexes(self, collection_name):
-        """Create indexes for the collection fields."""
-        collection = self.create_or_load_collection(collection_name)
+        """Create indexes for the collection fields (the shared collection in the corpus layout)."""
+        if self.layout == "corpus":
+            collection = self.create_or_load_corpus_collection()
+        else:
+            collection = self.create_or_load_collection(collection_name)
         collection.flush()
-        index_params = {"index_type": "HNSW", "metric_type": "IP", "params": {"M": 16, "efConstruction": 200}}
+        if self._create_missing_indexes(collection):
+            # A newly indexed collection becomes searchable.
+            self._corpus_changed()
+        print(f"Indexes created for '{collection.name}'.")
 
-        collection.create_index("main_title_embedding", index_params)
-        collection.create_index("section_title_embedding", index_params)
-        collection.create_index("sub_heading_embedding", index_params)
-        collection.create_index("content_embedding", index_params)
-        print(f"Indexes created for '{collection_name}'.")
+    def _create_missing_indexes(self, collection):
+        """Index the vector fields that have no index yet; returns whether any index was created."""
+        index_params = self.storage_for_collection(collection).index_params()
+        indexed = {index.field_name for index in collection.indexes}
+        missing = [field for field in VECTOR_FIELDS if field not in indexed]
+        for field in missing:
+            collection.create_index(field, index_params)
+        return bool(missing)
 
-    def query(self, query_text, anns_field="sub_heading_embedding", limit=5, threshold=0.85):
-        """Query the collection with a given text and filter results based on similarity threshold."""
-        collections = list_collections()
-        combined_results = {}
+    @staticmethod
+    def _has_field(collection, name):
+        return any(field.name == name for field in collection.schema.fields)
 
-        print(f"Provided Answer field is: {anns_field}")
+    @staticmethod
+    def _format_hit(hit, anns_field, collection_name, with_section=False):
+        if anns_field == "content_embedding":
+            image_path = hit.get("image_path") or "No image provided"    # Check for image field
+            result = {
+                "text": hit.get("text"),  # Retrieve content
+                "image": image_path,  # Assign image path or "No image provided"
+                "collection_name": collection_name,
+                "similarity": hit.distance
+            }
+        else:
+            result = {
+                "text": hit.entity.get("text"),
+                "sub_heading": hit.entity.get("sub_heading"),
+                "collection_name": collection_name,
+                "similarity": hit.distance
+            }
+        if with_section:
+            result["section_id"] = hit.entity.get("parent_id")
+        return result
 
-        for collection_name in collections:
-            collection = self.create_or_load_collection(collection_name)
-            collection.load()
-            query_embedding = self.generate_embeddings(query_text)
+    def _cache_lookup(self, query_text, params):
+        """
+        Look a text search up in the result cache, exact match first, then by query embedding.
+        Returns (cached results or None, the query embedding if it was computed, corpus version).
+        """
+        if self.search_cache is None:
+            return None, self.generate_embeddings(query_text), None
+        version = self.search_cache.corpus_version()
+        results = self.search_cache.get(query_text, params)
+        if results is not None:
+            return results, None, version
+        query_vector = self.generate_embeddings(query_text)
+        return self.search_cache.get_similar(query_vector, params), query_vector, version
 
-            search_params = {"metric_type": "IP", "params": {"ef": 128}}
+    def _cache_store(self, query_text, params, results, query_vector=None, version=None):
+        if self.search_cache is not None:
+            self.search_cache.put(query_text, params, results, query_vector, version)
+        return results
 
-            if anns_field == "content_embedding":
+    def _corpus_changed(self):
+        """Invalidate cached search results after the stored vectors changed."""
+        if self.search_cache is not None:
+            self.search_cache.bump_corpus_version()
+
+    def query(self, query_text, anns_field="sub_heading_embedding", limit=5, threshold=0.85, doc_ids=None,
+              top_k=None, collapse_chunks=False, node_type=None, page_range=None, max_similarity=None):
+        """
+        Query the collections with a given text and filter results based on similarity threshold.
+        Results are grouped by document; doc_ids optionally restricts the search to some documents
+        and top_k keeps only the best top_k hits over all documents. With collapse_chunks, each
+        section is returned once, as its best matching chunk, with its id under "section_id".
+        node_type ("image" or "text") and page_range filter nodes in Milvus; ungrouped searches
+        also leave the threshold (and max_similarity) to Milvus as a range search.
+        """
+        combined_results = {}
+        output_fields = ["text", "image_path"] if anns_field == "content_embedding" else ["text", "sub_heading"]
+
+        print(f"Provided Answer field is: {anns_field}")
+        params = {"search": "query", "anns_field": anns_field, "limit": limit, "threshold": threshold,
+                  "doc_ids": sorted(doc_ids) if doc_ids else None, "top_k": top_k, "search_params": self.search_params,
+                  "collapse_chunks": collapse_chunks, "node_type": node_type,
+                  "page_range": list(page_range) if page_range else None, "max_similarity": max_similarity}
+        cached, query_vector, version = self._cache_lookup(query_text, params)
+        if cached is not None:
+            return cached
+
+        if self.layout == "corpus":
+            # One request for the whole corpus, grouped so every document gets its own top hits.
+            # Grouping search is not combined with range search, so the threshold is applied
+            # here, as is collapsing chunks, over extra hits per document.
+            with self.collection_in_use(self.corpus_collection) as collection:
+                storage = self.storage_for_collection(collection)
+                collapse = collapse_chunks and self._has_field(collection, "parent_id")
                 results = collection.search(
-                    data=[query_embedding],
-                    anns_field=anns_field,  # Search using content_embedding
-                    param=search_params,
-                    limit=limit * 2,
-                    output_fields=["text", "image_path"]  # Get full content & metadata
+                    data=[storage.transform(query_vector)],
+                    anns_field=anns_field,
+                    param=storage.search_params(),
+                    limit=self.corpus_max_documents,
+                    expr=self.node_filter(collection, doc_ids, node_type, page_range),
+                    output_fields=output_fields + ["doc_id"] + (["parent_id"] if collapse else []),
+                    group_by_field="doc_id",
+                    group_size=limit * CHUNK_OVERFETCH if collapse else limit,
                 )
-
-                filtered_results = []
+                seen_sections = set()
                 for res in results:
                     for hit in res:
-                        if hit.distance >= threshold:  # Filter based on similarity threshold
-                            image_path = hit.get("image_path") or "No image provided"    # Check for image field
+                        doc_id = hit.entity.get("doc_id")
+                        doc_results = combined_results.setdefault(doc_id, [])
+                        if len(doc_results) >= limit or hit.distance < threshold or \
+                                (max_similarity is not None and hit.distance > max_similarity):
+                            continue
+                        if collapse:
+                            if hit.entity.get("parent_id") in seen_sections:
+                                continue
+                            seen_sections.add(hit.entity.get("parent_id"))
+                        doc_results.append(self._format_hit(hit, anns_field, doc_id, collapse))
+                if top_k:
+                    combined_results = self.merge_top_k(combined_results, top_k)
+                return self._cache_store(query_text, params, combined_results, query_vector, version)
 
-                            filtered_results.append({
-                                "text": hit.get("text"),  # Retrieve content
-                                "image": image_path,  # Assign image path or "No image provided"
-                                "collection_name": collection_name,
-                                "similarity": hit.distance
-                            })
+        # Per-document layout: the query is embedded once and the collections are searched
+        # concurrently, at most search_concurrency requests in flight.
+        collection_names = [name for name in self.document_collections() if not doc_ids or name in doc_ids]
+
+        def search_collection(collection_name):
+            with self.collection_in_use(collection_name) as collection:
+                storage = self.storage_for_collection(collection)
+                # Milvus groups the chunk hits of a collection by section itself; ungrouped searches
+                # are range searches, so only hits above the threshold come back.
+                collapse = collapse_chunks and self._has_field(collection, "parent_id")
+                if collapse:
+                    search_args = {"param": storage.search_params(), "group_by_field": "parent_id"}
+                else:
+                    search_args = {"param": self.range_params(storage, threshold, max_similarity)}
 
-            else:
                 results = collection.search(
-                    data=[query_embedding],
+                    data=[storage.transform(query_vector)],
                     anns_field=anns_field,
-                    param=search_params,
-                    limit=limit * 2,
-                    output_fields=["text", "sub_heading"]
+                    limit=limit,
+                    expr=self.node_filter(collection, node_type=node_type, page_range=page_range),
+                    output_fields=output_fields + (["parent_id"] if collapse else []),
+                    **search_args
                 )
-                # print("Search result: ", results)
+
                 filtered_results = []
                 for res in results:
                     for hit in res:
-                        if hit.distance >= threshold:
-                            filtered_results.append({
-                                "text": hit.entity.get("text"),
-                                "sub_heading": hit.entity.get("sub_heading"),
-                                "collection_name": collection_name,
-                                "similarity": hit.distance
-                            })
+                        if collapse and (hit.distance < threshold or
+                                         (max_similarity is not None and hit.distance > max_similarity)):
+                            continue
+                        filtered_results.append(self._format_hit(hit, anns_field, collection_name, collapse))
+                return filtered_results
+
+        if collection_names:
+            with ThreadPoolExecutor(max_workers=min(self.search_concurrency, len(collection_names))) as executor:
+                for collection_name, filtered_results in zip(collection_names,
+                                                             executor.map(search_collection, collection_names)):
+                    combined_results[collection_name] = filtered_results
 
-            combined_results[collection_name] = filtered_results[:limit]
+        if top_k:
+            combined_results = self.merge_top_k(combined_results, top_k)
+        return self._cache_store(query_text, params, combined_results, query_vector, version)
 
-        return combined_results
+    def _hybrid_request(self, collection, query_vector, limit, expr=None):
+        """Run one hybrid search over the weighted vector fields of a collection."""
+        storage = self.storage_for_collection(collection)
+        vector = storage.transform(query_vector)
+        fields = [field for field in VECTOR_FIELDS if self.hybrid_weights.get(field, 0) > 0]
+        requests = [self.store.AnnSearchRequest(data=[vector], anns_field=field, param=storage.search_params(),
+                                                limit=limit, expr=expr)
+                    for field in fields]
+        if self.hybrid_ranker == "weighted":
+            ranker = self.store.WeightedRanker(*[self.hybrid_weights[field] for field in fields])
+        else:
+            ranker = self.store.RRFRanker(self.rrf_k)
+        output_fields = ["text", "sub_heading", "image_path"]
+        if self.layout == "corpus":
+            output_fields.append("doc_id")
+        if self._has_field(collection, "parent_id"):
+            output_fields.append("parent_id")
+        return collection.hybrid_search(requests, ranker, limit=limit, output_fields=output_fields)
 
-    def perform_default_queries(self):
-        """Perform default searches and organize results by collection and query type."""
-        default_queries = ["Introduction", "Abstract", "Conclusion", "References", "Methodology", "Results"]
-        collections = list_collections()
-        organized_results = {query: {} for query in default_queries}
+    @staticmethod
+    def _format_hybrid_hit(hit, collection_name, with_section=False):
+        result = {
+            "text": hit.entity.get("text"),
+            "sub_heading": hit.entity.get("sub_heading"),
+            "image": hit.entity.get("image_path") or "No image provided",
+            "collection_name": collection_name,
+            "similarity": hit.distance
+        }
+        if with_section:
+            result["section_id"] = hit.entity.get("parent_id")
+        return result
 
-        for collection_name in collections:
-            collection = self.create_or_load_collection(collection_name)
-            collection.load()
+    def hybrid_query(self, query_text, limit=5, threshold=None, doc_ids=None, top_k=None, collapse_chunks=False,
+                     node_type=None, page_range=None):
+        """
+        Score all four vector fields in a single hybrid request per collection, fusing the
+        per-field rankings on the server with RRF or weighted ranking. Returns the same
+        shape as query(); "similarity" is the fused score, so threshold is on that scale.
+        With collapse_chunks, each section is returned once, as its best matching chunk.
+        node_type and page_range filter the nodes of every field request in Milvus.
+        """
+        combined_results = {}
+        params = {"search": "hybrid", "limit": limit, "threshold": threshold,
+                  "doc_ids": sorted(doc_ids) if doc_ids else None, "top_k": top_k, "ranker": self.hybrid_ranker,
+                  "weights": self.hybrid_weights, "rrf_k": self.rrf_k, "search_params": self.search_params,
+                  "collapse_chunks": collapse_chunks, "node_type": node_type,
+                  "page_range": list(page_range) if page_range else None}
+        cached, query_vector, version = self._cache_lookup(query_text, params)
+        if cached is not None:
+            return cached
+        request_limit = limit * CHUNK_OVERFETCH if collapse_chunks else limit
+        seen_sections = set()
+
+        def keep(hit):
+            if threshold is not None and hit.distance < threshold:
+                return False
+            if collapse_chunks and hit.entity.get("parent_id") is not None:
+                if hit.entity.get("parent_id") in seen_sections:
+                    return False
+                seen_sections.add(hit.entity.get("parent_id"))
+            return True
+
+        if self.layout == "corpus":
+            with self.collection_in_use(self.corpus_collection) as collection:
+                results = self._hybrid_request(collection, query_vector,
+                                               min(request_limit * self.corpus_max_documents, 16384),
+                                               self.node_filter(collection, doc_ids, node_type, page_range))
+                for res in results:
+                    for hit in res:
+                        doc_id = hit.entity.get("doc_id")
+                        doc_results = combined_results.setdefault(doc_id, [])
+                        if len(doc_results) < limit and keep(hit):
+                            doc_results.append(self._format_hybrid_hit(hit, doc_id, collapse_chunks))
+        else:
+            collection_names = [name for name in self.document_collections() if not doc_ids or name in doc_ids]
+
+            def search_collection(collection_name):
+                with self.collection_in_use(collection_name) as collection:
+                    expr = self.node_filter(collection, node_type=node_type, page_range=page_range)
+                    results = self._hybrid_request(collection, query_vector, request_limit, expr)
+                    # Section ids are unique per collection, so one shared set is safe across threads.
+                    hits = [self._format_hybrid_hit(hit, collection_name, collapse_chunks)
+                            for res in results for hit in res if keep(hit)]
+                    return hits[:limit]
+
+            if collection_names:
+                with ThreadPoolExecutor(max_workers=min(self.search_concurrency, len(collection_names))) as executor:
+                    combined_results = dict(zip(collection_names, executor.map(search_collection, collection_names)))
+
+        if top_k:
+            combined_results = self.merge_top_k(combined_results, top_k)
+        return self._cache_store(query_text, params, combined_results, query_vector, version)
+
+    @staticmethod
+    def merge_top_k(combined_results, k):
+        """
+        Keep only the k most similar hits across all documents. The result stays keyed by
+        document, with each document's hits in their original order.
+        """
+        ranked = heapq.nlargest(k, ((hit["similarity"], name, position)
+                                    for name, hits in combined_results.items()
+                                    for position, hit in enumerate(hits)))
+        keep = {(name, position) for _, name, position in ranked}
+        return {name: [hit for position, hit in enumerate(hits) if (name, position) in keep]
+                for name, hits in combined_results.items()}
+
+    def default_query_vectors(self):
+        """Embeddings of DEFAULT_QUERIES, computed once per process for each embedding backend."""
+        vectors = MilvusEmbeddingManager._default_query_vectors.get(self.embedding_id)
+        if vectors is None:
+            vectors = np.asarray(self.generate_embeddings_batch(list(self.DEFAULT_QUERIES)), dtype=np.float32)
+            MilvusEmbeddingManager._default_query_vectors[self.embedding_id] = vectors
+        return vectors
 
-            for query_text in default_queries:
-                query_embedding = self.generate_embeddings(query_text)
-                search_params = {"metric_type": "IP", "params": {"ef": 128}}
+    def perform_default_queries(self, doc_ids=None):
+        """
+        Perform default searches and organize results by collection and query type. All default
+        queries go to a collection in a single multi-vector request.
+        """
+        organized_results = {query: {} for query in self.DEFAULT_QUERIES}
+        params = {"search": "default", "queries": list(self.DEFAULT_QUERIES),
+                  "doc_ids": sorted(doc_ids) if doc_ids else None, "search_params": self.search_params}
+        version = self.search_cache.corpus_version() if self.search_cache else None
+        cached = self.search_cache.get("", params) if self.search_cache else None
+        if cached is not None:
+            return cached
+        query_vectors = self.default_query_vectors()
+
+        if self.layout == "corpus":
+            with self.collection_in_use(self.corpus_collection) as collection:
+                storage = self.storage_for_collection(collection)
 
                 results = collection.search(
-                    data=[query_embedding],
+                    data=list(storage.transform(query_vectors)),
                     anns_field="sub_heading_embedding",
-                    param=search_params,
+                    param=storage.search_params(),
+                    limit=self.corpus_max_documents,
+                    expr=self.doc_filter(doc_ids),
+                    output_fields=["text", "sub_heading", "doc_id"],
+                    group_by_field="doc_id",
+                    group_size=1,
+                )
+                for query_text, res in zip(self.DEFAULT_QUERIES, results):
+                    for hit in res:
+                        organized_results[query_text].setdefault(hit.entity.get("doc_id"), []).append({
+                            "text": hit.entity.get("text"),
+                            "similarity": hit.distance
+                        })
+                return self._cache_store("", params, organized_results, version=version)
+
+        collection_names = [name for name in self.document_collections() if not doc_ids or name in doc_ids]
+
+        def search_collection(collection_name):
+            with self.collection_in_use(collection_name) as collection:
+                storage = self.storage_for_collection(collection)
+
+                return collection.search(
+                    data=list(storage.transform(query_vectors)),
+                    anns_field="sub_heading_embedding",
+                    param=storage.search_params(),
                     limit=1,
                     output_fields=["text", "sub_heading"]
                 )
 
-                for res in results:
+        if not collection_names:
+            return organized_results
+        with ThreadPoolExecutor(max_workers=min(self.search_concurrency, len(collection_names))) as executor:
+            for collection_name, results in zip(collection_names, executor.map(search_collection, collection_names)):
+                # results[i] holds the hits of DEFAULT_QUERIES[i].
+                for query_text, res in zip(self.DEFAULT_QUERIES, results):
                     for hit in res:
                         query_results = organized_results[query_text].setdefault(collection_name, [])
                         query_results.append({
@@ -215,25 +895,150 @@ class MilvusEmbeddingManager:
                             "similarity": hit.distance
                         })
 
-        return organized_results
+        return self._cache_store("", params, organized_results, version=version)
 
-    def get_column_counts(self):
-        """Get the count of items in each column of all collections."""
-        collections = list_collections()
-        column_counts = {}
+    @staticmethod
+    def _stored_vector(value):
+        """A vector as returned by a query; float16 vectors come back as raw bytes."""
+        if isinstance(value, list) and value and isinstance(value[0], bytes):
+            value = value[0]
+        if isinstance(value, bytes):
+            return np.frombuffer(value, dtype=np.float16)
+        return np.asarray(value)
 
-        for collection_name in collections:
-            collection = self.create_or_load_collection(collection_name)
-            collection.load()
-            collection.flush()
+    def migrate_to_corpus(self, collection_names=None, batch_size=512, drop=False):
+        """
+        Copy per-document collections into the corpus collection, paging through each one with a
+        query iterator. Vectors are copied as stored when the storage modes match, and converted
+        when both sides keep full-dimension vectors. Returns the number of rows copied.
+        """
+        target = self.create_or_load_corpus_collection()
+        target_storage = self.storage_for_collection(target)
+        copied = 0
+
+        for collection_name in collection_names or self.document_collections():
+            source = self.store.Collection(name=collection_name, using=self.alias)
+            source_storage = self.storage_for_collection(source)
+            if source_storage.mode != target_storage.mode and "pca" in (source_storage.mode, target_storage.mode):
+                raise ValueError(f"Cannot migrate '{collection_name}' from {source_storage.mode} "
+                                 f"to {target_storage.mode} storage; re-ingest it instead.")
+
+            source.load()
+            self._delete_document(target, collection_name)
+            doc_rows = 0
+            chunked = any(field.name == "parent_id" for field in source.schema.fields)
+            chunk_fields = ["parent_id", "chunk_index"] if chunked else []
+            if any(field.name == "page_num" for field in source.schema.fields):
+                chunk_fields.append("page_num")
+            for batch in self.scan(source, ["id", "text", "sub_heading", "image_path", *chunk_fields, *VECTOR_FIELDS],
+                                   batch_size=batch_size):
+                rows = [{
+                    "id": self.corpus_row_id(collection_name, entity["id"]),
+                    "doc_id": collection_name,
+                    "node_index": entity["id"],
+                    "content": entity["text"],
+                    "main_title": "",
+                    "section_title": "",
+                    "sub_heading": entity["sub_heading"],
+                    "image_path": entity["image_path"],
+                    "content_hash": "",
+                    "parent_id": self.corpus_row_id(collection_name, entity["parent_id"] if chunked else entity["id"]),
+                    "chunk_index": entity.get("chunk_index", 0),
+                    "node_type": "text" if entity["image_path"] in ("No image available", "") else "image",
+                    "page_num": entity.get("page_num", 0),
+                } for entity in batch]
+                vectors = np.array([[self._stored_vector(entity[field]) for field in VECTOR_FIELDS]
+                                    for entity in batch])
+                if source_storage.mode != target_storage.mode:
+                    vectors = target_storage.transform(vectors.astype(np.float32))
+                self._insert_rows(target, rows, vectors)
+                doc_rows += len(rows)
+
+            copied += doc_rows
+            print(f"Migrated {doc_rows} rows of '{collection_name}' into '{self.corpus_collection}'.")
+            if drop:
+                self.store.utility.drop_collection(collection_name, using=self.alias)
+                self.loaded.forget(collection_name)
 
-            fields = [field.name for field in collection.schema.fields]
-            column_counts[collection_name] = {}
+        target.flush()
+        self._corpus_changed()
+        index_params = target_storage.index_params()
+        indexed = {index.field_name for index in target.indexes}
+        for field in VECTOR_FIELDS:
+            if field not in indexed:
+                target.create_index(field, index_params)
+        return copied
+
+    @staticmethod
+    def scan(collection, output_fields, expr="id >= 0", batch_size=1000):
+        """Page through the matching rows of a loaded collection with a query iterator, one batch at a time."""
+        iterator = collection.query_iterator(batch_size=batch_size, expr=expr, output_fields=output_fields)
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                yield batch
+        finally:
+            iterator.close()
+
+    @staticmethod
+    def count_rows(collection, expr=""):
+        """Exact number of live rows matching expr, counted on the server with count(*)."""
+        return collection.query(expr=expr, output_fields=["count(*)"])[0]["count(*)"]
+
+    def collection_stats(self, collection_names=None, load=False):
+        """
+        Row counts, index status and segment sizes of every collection, without moving any
+        vector data. num_entities comes from segment metadata and still includes deleted rows;
+        row_count (exact) and the segment figures need the collection to be loaded, so they
+        are only reported for loaded collections unless load is set.
+        """
+        stats = {}
+        for collection_name in collection_names or self.store.list_collections(using=self.alias):
+            if load:
+                collection = self.loaded_collection(collection_name)
+            else:
+                collection = self.store.Collection(name=collection_name, using=self.alias)
+            loaded = collection_name in self.loaded or \
+                self.store.utility.load_state(collection_name, using=self.alias).name == "Loaded"
 
-            for field in fields:
-                results = collection.query(expr="", output_fields=[field], limit=10000)
-                column_counts[collection_name][field] = len(results)
+            entry = {
+                "fields": [field.name for field in collection.schema.fields],
+                "storage": self.storage_for_collection(collection).mode,
+                "num_entities": collection.num_entities,
+                "loaded": loaded,
+                "indexes": {},
+            }
+            for index in collection.indexes:
+                progress = self.store.utility.index_building_progress(collection_name,
+                                                                      index_name=index.index_name,
+                                                                      using=self.alias)
+                entry["indexes"][index.field_name] = {
+                    "index_type": index.params.get("index_type"),
+                    "indexed_rows": progress.get("indexed_rows"),
+                    "total_rows": progress.get("total_rows"),
+                    "pending_index_rows": progress.get("pending_index_rows", 0),
+                }
 
+            if loaded:
+                entry["row_count"] = self.count_rows(collection)
+                try:
+                    segments = self.store.utility.get_query_segment_info(collection_name, using=self.alias)
+                except Exception as e:  # Milvus Lite does not implement segment info.
+                    print(f"No segment info for '{collection_name}': {type(e).__name__}")
+                else:
+                    entry["segments"] = len(segments)
+                    entry["memory_bytes"] = sum(segment.mem_size for segment in segments)
+            stats[collection_name] = entry
+        return stats
+
+    def get_column_counts(self):
+        """Get the count of items in each column of all collections."""
+        column_counts = {}
+        for collection_name, entry in self.collection_stats().items():
+            count = entry.get("row_count", entry["num_entities"])
+            column_counts[collection_name] = {field: count for field in entry["fields"]}
         return column_counts
 
 # Example usage
@@ -241,6 +1046,18 @@ if __name__ == "__main__":
 
     manager = MilvusEmbeddingManager()
 
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        args = sys.argv[2:]
+        drop = "--drop" in args
+        names = [arg for arg in args if arg != "--drop"]
+        copied = manager.migrate_to_corpus(names or None, drop=drop)
+        print(f"Migrated {copied} rows into the corpus collection '{manager.corpus_collection}'.")
+        sys.exit(0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "stats":
+        print(json.dumps(manager.collection_stats(sys.argv[2:] or None, load=True), indent=4))
+        sys.exit(0)
+
     json_files = sys.argv[1:]
 
     if json_files:
@@ -257,5 +1074,10 @@ if __name__ == "__main__":
         default_results = manager.perform_default_queries()
         # print("Default Results:", json.dumps(default_results, indent=4))
 
-    column_counts = manager.get_column_counts()
-    print("Column counts:", json.dumps(column_counts, indent=4))
+    print("Collection stats:", json.dumps(manager.collection_stats(), indent=4))
+
+    if manager.embedding_cache:
+        print("Embedding cache:", json.dumps(manager.embedding_cache.stats(), indent=4))
+    if manager.search_cache:
+        print("Search cache:", json.dumps(manager.search_cache.stats(), indent=4))
+    print("Embedding models:", json.dumps(EmbeddingModelRegistry.report(), indent=4))
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from collections import OrderedDict
+
+
+class SearchResultCache:
+    """
+    Cache of search results in SQLite, with an in-process LRU tier in front of it.
+
+    The exact tier is keyed on the query text and the search parameters (field, limit,
+    threshold, documents, ...). The semantic tier reuses the results of a cached query with
+    the same parameters whose embedding lies within a cosine distance of radius of the new
+    query's. Every entry records the corpus version it was computed at; ingestion bumps the
+    version, which invalidates both tiers for every process sharing the database.
+    """
+
+    def __init__(self, path=".search_cache/results.sqlite", scope="", radius=0.05, max_entries=10000,
+                 memory_items=1024, max_neighbours=2000):
+        self.path = path
+        self.scope = scope
+        self.radius = radius
+        self.max_entries = max_entries
+        self.memory_items = memory_items
+        self.max_neighbours = max_neighbours
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, params_key TEXT NOT NULL, "
+            "version INTEGER NOT NULL, vector BLOB, results TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_params ON results (params_key, version)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS corpus_version (id INTEGER PRIMARY KEY, version INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO corpus_version (id, version) VALUES (0, 0)")
+        self._conn.commit()
+
+    def params_key(self, params):
+        """Hash of the scope and the search parameters, shared by every query text."""
+        encoded = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(f"{self.scope}\0{encoded}".encode("utf-8")).hexdigest()
+
+    def key(self, query_text, params):
+        """Hash of the search parameters and the query text with whitespace runs collapsed."""
+        normalized = " ".join(query_text.split())
+        return hashlib.sha256(f"{self.params_key(params)}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def corpus_version(self):
+        with self._lock:
+            return self._conn.execute("SELECT version FROM corpus_version WHERE id = 0").fetchone()[0]
+
+    def bump_corpus_version(self):
+        """Invalidate every cached result; called whenever the stored vectors change."""
+        with self._lock:
+            self._conn.execute("UPDATE corpus_version SET version = version + 1 WHERE id = 0")
+            version = self._conn.execute("SELECT version FROM corpus_version WHERE id = 0").fetchone()[0]
+            self._conn.execute("DELETE FROM results WHERE version < ?", (version,))
+            self._conn.commit()
+            self._memory.clear()
+        return version
+
+    def _remember(self, key, version, results):
+        self._memory[key] = (version, results)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, query_text, params):
+        """Results of an identical earlier search at the current corpus version, or None."""
+        key = self.key(query_text, params)
+        version = self.corpus_version()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] == version:
+                self._memory.move_to_end(key)
+                self.exact_hits += 1
+                return json.loads(entry[1])
+
+            row = self._conn.execute("SELECT results FROM results WHERE key = ? AND version = ?",
+                                     (key, version)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self._remember(key, version, row[0])
+            self.exact_hits += 1
+            return json.loads(row[0])
+
+    def get_similar(self, query_vector, params):
+        """
+        Results of an earlier search with the same parameters whose query embedding is within
+        the cosine radius of query_vector, or None.
+        """
+        if not self.radius or self.radius <= 0:
+            return None
+        version = self.corpus_version()
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, vector FROM results WHERE params_key = ? AND version = ? AND vector IS NOT NULL "
+                "ORDER BY last_used DESC LIMIT ?",
+                (self.params_key(params), version, self.max_neighbours),
+            ).fetchall()
+            if not rows:
+                return None
+            vectors = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+            norms = np.linalg.norm(vectors, axis=1) * max(float(np.linalg.norm(query_vector)), 1e-12)
+            similarities = vectors @ query_vector / np.clip(norms, 1e-12, None)
+            best = int(np.argmax(similarities))
+            if 1.0 - similarities[best] > self.radius:
+                return None
+
+            key = rows[best][0]
+            results = self._conn.execute("SELECT results FROM results WHERE key = ?", (key,)).fetchone()[0]
+            self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.semantic_hits += 1
+            return json.loads(results)
+
+    def put(self, query_text, params, results, query_vector=None, version=None):
+        """
+        Store the results of a search that missed the cache; with query_vector the entry also
+        serves the semantic tier. version is the corpus version read before searching, so results
+        of a search that overlapped an ingestion are not stored as current.
+        """
+        key = self.key(query_text, params)
+        if version is None:
+            version = self.corpus_version()
+        encoded = json.dumps(results)
+        vector = np.asarray(query_vector, dtype=np.float32).tobytes() if query_vector is not None else None
+        with self._lock:
+            self.misses += 1
+            self._remember(key, version, encoded)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, params_key, version, vector, results, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, self.params_key(params), version, vector, encoded, time.time()),
+            )
+            excess = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used LIMIT ?)", (excess,)
+                )
+            self._conn.commit()
+
+    def hit_rate(self):
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "corpus_version": self.corpus_version(),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
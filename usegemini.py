@@ -1,24 +1,123 @@
 import asyncio
 import os
-import google.generativeai as genai
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import google.generativeai as genai
 from dotenv import load_dotenv
+from google.api_core import exceptions as google_exceptions
+
+# Errors worth retrying: rate limiting (429, raised as ResourceExhausted over gRPC and as
+# TooManyRequests over REST) and transient server-side failures.
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+
+class TokenBucket:
+    """
+    Async token bucket: requests are admitted at rate per second on average, with bursts of
+    up to capacity requests.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = None
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
 
 
 class ModelGemini:
-    def __init__(self):
+    """
+    Async Gemini client. The blocking SDK call runs on a thread pool over one shared model
+    handle, so concurrent prompts really overlap. At most max_concurrency requests are in
+    flight, requests are admitted by a token bucket of requests_per_minute, and rate-limit
+    and transient errors are retried with jittered exponential backoff.
+
+    Settings come from the arguments or the environment (and .env): GEMINI_API_KEY,
+    GEMINI_MODEL, GEMINI_MAX_CONCURRENCY, GEMINI_REQUESTS_PER_MINUTE, GEMINI_MAX_RETRIES
+    and GEMINI_API_ENDPOINT, which points the REST transport at another server, e.g.
+    benchmarks/fake_gemini_server.py.
+    """
+
+    def __init__(self, model_name=None, max_concurrency=None, requests_per_minute=None, max_retries=None,
+                 api_endpoint=None, api_key=None, backoff_base=1.0, backoff_cap=30.0, timeout=120):
         load_dotenv()
-        self.gemini_api_key = os.getenv("GEMINI_API_KEY")
+        self.gemini_api_key = api_key or os.getenv("GEMINI_API_KEY")
         if not self.gemini_api_key:
             raise ValueError("API key for GEMINI is not set in the .env file.")
         os.environ["GEMINI_API_KEY"] = self.gemini_api_key
-        genai.configure(api_key=self.gemini_api_key)
+
+        self.model_name = model_name or os.getenv("GEMINI_MODEL", "gemini-1.5-flash-8b")
+        self.max_concurrency = int(max_concurrency or os.getenv("GEMINI_MAX_CONCURRENCY", 4))
+        self.requests_per_minute = float(requests_per_minute or os.getenv("GEMINI_REQUESTS_PER_MINUTE", 60))
+        self.max_retries = int(max_retries if max_retries is not None else os.getenv("GEMINI_MAX_RETRIES", 5))
+        self.api_endpoint = api_endpoint or os.getenv("GEMINI_API_ENDPOINT")
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+
+        if self.api_endpoint:
+            genai.configure(api_key=self.gemini_api_key, transport="rest",
+                            client_options={"api_endpoint": self.api_endpoint})
+        else:
+            genai.configure(api_key=self.gemini_api_key)
+        self.model = genai.GenerativeModel(self.model_name)
+
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="gemini")
+        self.rate_limiter = TokenBucket(self.requests_per_minute / 60.0)
+        self._semaphore = None
+        self.requests = 0
+        self.retries = 0
+
+    def _backoff(self, attempt):
+        """Full jitter: a random delay up to the exponential backoff for this attempt."""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def _generate(self, prompt):
+        # The SDK's own retries are disabled; retrying happens in gemini_response.
+        return self.model.generate_content(prompt, request_options={"timeout": self.timeout, "retry": None}).text
 
     async def gemini_response(self, prompt):
-        model = genai.GenerativeModel("gemini-1.5-flash-8b")
-        response = model.generate_content(prompt)
-        await asyncio.sleep(1)
-        return response.text
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.rate_limiter.acquire()
+                self.requests += 1
+                try:
+                    return await loop.run_in_executor(self.executor, self._generate, prompt)
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self._backoff(attempt)
+                    self.retries += 1
+                    print(f"Gemini request failed ({type(e).__name__}); retrying in {delay:.1f}s.")
+                    await asyncio.sleep(delay)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
 
 def main():
     model = ModelGemini()
@@ -0,0 +1,136 @@
+import json
+import os
+import re
+import sys
+
+import numpy as np
+
+from embeddings import EMBEDDING_DIM
+
+# float32: full precision vectors, HNSW index (the original layout).
+# float16: FLOAT16_VECTOR fields, half the raw vector memory, HNSW index.
+# sq8: full precision fields with an IVF_SQ8 index, which keeps one byte per dimension in memory.
+# pca: vectors projected onto a corpus-fitted PCA basis of lower dimension, HNSW index.
+STORAGE_MODES = ("float32", "float16", "sq8", "pca")
+DEFAULT_PCA_PATH = ".vector_storage/pca.npz"
+
+
+class VectorStorage:
+    """
+    How the node vectors of a collection are stored and indexed in Milvus, and the matching
+    transform that has to be applied to vectors, both at insert and at query time.
+    """
+
+    def __init__(self, mode="float32", pca_path=DEFAULT_PCA_PATH, index=None, search=None):
+        if mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode '{mode}'. Choose one of {STORAGE_MODES}.")
+        self.mode = mode
+        self.pca_path = pca_path
+        # Optional overrides of the mode's defaults, e.g. {"index_type": "HNSW", "params": {"M": 32}}
+        # for index and {"ef": 64} for search, as picked with benchmarks/bench_index.py.
+        self.index = index
+        self.search = search
+        self.pca_mean = None
+        self.pca_components = None
+        if mode == "pca":
+            self._load_pca()
+
+    def _load_pca(self):
+        if not os.path.exists(self.pca_path):
+            raise ValueError(f"No PCA projection at '{self.pca_path}'. Fit one first with "
+                             f"'python vector_storage.py fit-pca <dim> <nodes.json> ...'.")
+        projection = np.load(self.pca_path)
+        self.pca_mean = projection["mean"].astype(np.float32)
+        self.pca_components = projection["components"].astype(np.float32)
+
+    @property
+    def dim(self):
+        return self.pca_components.shape[0] if self.mode == "pca" else EMBEDDING_DIM
+
+    @property
+    def description_tag(self):
+        """Marker stored in the collection description so the mode can be recovered later."""
+        return f" [storage:{self.mode}]" if self.mode != "float32" else ""
+
+    @staticmethod
+    def mode_from_description(description):
+        match = re.search(r"\[storage:(\w+)\]", description or "")
+        return match.group(1) if match else "float32"
+
+    def transform(self, vectors):
+        """Map float32 embeddings (one vector or an (n, dim) array) to the stored representation."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.mode == "float16":
+            return vectors.astype(np.float16)
+        if self.mode == "pca":
+            projected = (vectors - self.pca_mean) @ self.pca_components.T
+            norms = np.linalg.norm(projected, axis=-1, keepdims=True)
+            projected = projected / np.clip(norms, 1e-12, None)
+            # Empty fields are stored as zero vectors; keep them zero so they never match.
+            empty = ~np.any(vectors, axis=-1, keepdims=True)
+            return np.where(empty, 0.0, projected).astype(np.float32)
+        return vectors
+
+    def index_params(self):
+        if self.index:
+            return {"index_type": self.index["index_type"], "metric_type": "IP", "params": self.index.get("params", {})}
+        if self.mode == "sq8":
+            return {"index_type": "IVF_SQ8", "metric_type": "IP", "params": {"nlist": 128}}
+        return {"index_type": "HNSW", "metric_type": "IP", "params": {"M": 16, "efConstruction": 200}}
+
+    def search_params(self):
+        if self.search is not None:
+            return {"metric_type": "IP", "params": self.search}
+        if self.mode == "sq8":
+            return {"metric_type": "IP", "params": {"nprobe": 16}}
+        return {"metric_type": "IP", "params": {"ef": 128}}
+
+    def vector_bytes(self):
+        """Raw bytes one stored vector takes in memory, ignoring index graph overhead."""
+        if self.mode == "float16":
+            return self.dim * 2
+        if self.mode == "sq8":
+            return self.dim
+        return self.dim * 4
+
+
+def fit_pca(vectors, dim, path=DEFAULT_PCA_PATH):
+    """
+    Fit a PCA projection to dim components on a corpus of embeddings and save it to path.
+    Returns the fraction of variance the kept components explain.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(vectors) < dim:
+        raise ValueError(f"Need at least {dim} vectors to fit {dim} components, got {len(vectors)}.")
+    mean = vectors.mean(axis=0)
+    _, singular_values, components = np.linalg.svd(vectors - mean, full_matrices=False)
+    variance = singular_values ** 2
+    explained = float(variance[:dim].sum() / variance.sum())
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez(path, mean=mean, components=components[:dim], explained_variance=explained)
+    return explained
+
+
+def main():
+    if len(sys.argv) < 4 or sys.argv[1] != "fit-pca":
+        print("Usage: python vector_storage.py fit-pca <dim> <nodes.json> [<nodes.json> ...]")
+        sys.exit(1)
+
+    from retrieval import MilvusEmbeddingManager
+
+    dim = int(sys.argv[2])
+    manager = MilvusEmbeddingManager(connect=False)
+    vectors = []
+    for json_file in sys.argv[3:]:
+        with open(json_file, "r", encoding="utf-8") as f:
+            rows = manager.flatten_nodes(json.load(f))
+        embeddings = manager.embed_rows(rows).reshape(-1, EMBEDDING_DIM)
+        vectors.append(embeddings[np.abs(embeddings).sum(axis=1) > 0])
+
+    explained = fit_pca(np.concatenate(vectors), dim)
+    print(f"Saved a {dim}-dim PCA projection to {DEFAULT_PCA_PATH} ({explained:.1%} of variance kept).")
+
+
+if __name__ == "__main__":
+    main()